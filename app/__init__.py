@@ -1,16 +1,38 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from config import Config
 
-app = Flask(__name__)
-app.config.from_object(Config)
+db = SQLAlchemy()
 
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+login = LoginManager()
+login.login_view = 'auth.login'  # tell flask-login what the login view function is
 
-login = LoginManager(app)
-login.login_view = 'login'  # tell flask-login what the login view function is
 
-from app import routes
+def create_app(config=Config):
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    db.init_app(app)
+    login.init_app(app)
+
+    # Importing the blueprints registers every model and commit hook. Each app gets its own caches, indexes and
+    # pools in app.extensions; the module-level names used by the routes look them up through current_app
+    from app import answer_search, cli, database, http_cache, instrumentation, models, passwords
+    from app.catalog import questions, languages
+    from app.fragments import fragments
+    from app.forum import hot_threads
+    from app.geo import geo_index
+    from app.likes import like_graph
+    from app.matching import match_index
+    from app.presence import presence
+    from app.routes import blueprints
+    from app.search import search_index
+
+    for extension in (answer_search, database, http_cache, instrumentation, models, passwords, questions, languages,
+                      fragments, hot_threads, geo_index, like_graph, match_index, presence, search_index):
+        extension.init_app(app)
+    for blueprint in blueprints:
+        app.register_blueprint(blueprint)
+    cli.init_app(app)
+    return app
@@ -0,0 +1,210 @@
+import math
+import re
+import sqlite3
+import time
+from collections import Counter
+from datetime import timedelta
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy import DDL, event, text
+
+from app import db
+from app.models import User, Question, Answer
+from app.search import details_visible
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(body):
+    return TOKEN_RE.findall((body or '').lower())
+
+
+_fts5 = None
+
+
+def fts5_available():
+    global _fts5
+    if _fts5 is None:
+        try:
+            sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE probe USING fts5(body)')
+            _fts5 = True
+        except sqlite3.OperationalError:
+            _fts5 = False
+    return _fts5
+
+
+# Migrated databases get answer_fts from its migration; create_all() builds it along with the answer table
+event.listen(Answer.__table__, 'after_create', DDL(
+    "CREATE VIRTUAL TABLE answer_fts USING fts5(body, type UNINDEXED, tokenize = 'porter unicode61')").
+    execute_if(dialect='sqlite', callable_=lambda *args, **kwargs: fts5_available()))
+event.listen(Answer.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS answer_fts').execute_if(dialect='sqlite'))
+
+
+class Fts5Backend():
+    # Answers mirrored into an SQLite FTS5 table whose rowid is the answer id; ranks come from bm25()
+
+    def index(self, answer_id, body, type):
+        db.session.execute(text('DELETE FROM answer_fts WHERE rowid = :id'), {'id': answer_id})
+        db.session.execute(text('INSERT INTO answer_fts (rowid, body, type) VALUES (:id, :body, :type)'),
+                           {'id': answer_id, 'body': body, 'type': type})
+
+    def index_many(self, rows):
+        # Same as index() with one executemany per statement
+        params = [{'id': answer_id, 'body': body, 'type': type} for answer_id, body, type in rows]
+        db.session.execute(text('DELETE FROM answer_fts WHERE rowid = :id'), params)
+        db.session.execute(text('INSERT INTO answer_fts (rowid, body, type) VALUES (:id, :body, :type)'), params)
+
+    def search(self, terms, type, after, limit):
+        rank, last_id = after or (float('-inf'), 0)
+        rows = db.session.execute(text(
+            'SELECT id, rank FROM ('
+            '  SELECT rowid AS id, bm25(answer_fts) AS rank FROM answer_fts'
+            '  WHERE answer_fts MATCH :query AND type = :type'
+            ') WHERE rank > :rank OR (rank = :rank AND id > :id) ORDER BY rank, id LIMIT :limit'),
+            {'query': ' '.join('"{}"'.format(term) for term in terms), 'type': type,
+             'rank': rank, 'id': last_id, 'limit': limit})
+        return [(row[0], row[1]) for row in rows]
+
+
+class InvertedIndexBackend():
+    # Pure-Python fallback for other databases: postings per term, scored with the same BM25 formula.
+    # Each worker keeps its own copy, so it also re-reads answers any worker wrote or edited since its last look
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, sync_interval, sync_overlap):
+        self.lock = Lock()
+        self.postings = None  # term -> {answer id: term frequency}
+        self.docs = {}  # answer id -> (question type, token count, distinct terms)
+        self.total_length = 0
+        self.sync_interval = sync_interval
+        # Answer timestamps come from each writer's clock and commit in any order, so every sync reads again
+        # the answers stamped up to this long before the newest one already read
+        self.sync_overlap = timedelta(seconds=sync_overlap)
+        self.synced = None  # newest Answer.timestamp read so far
+        self.checked = 0
+
+    def ensure(self):
+        if self.postings is not None and time.monotonic() - self.checked < self.sync_interval:
+            return
+        rows = db.session.query(Answer.id, Answer.body, Question.type, Answer.timestamp).\
+            join(Question, Question.id == Answer.question_id)
+        if self.postings is None:
+            self.postings = {}
+            self.docs = {}
+            self.total_length = 0
+        elif self.synced is not None:
+            rows = rows.filter(Answer.timestamp > self.synced - self.sync_overlap)
+        self.checked = time.monotonic()
+        for answer_id, body, type, timestamp in rows:
+            self._remove(answer_id)
+            self._add(answer_id, body, type)
+            if timestamp is not None and (self.synced is None or timestamp > self.synced):
+                self.synced = timestamp
+
+    def _add(self, answer_id, body, type):
+        tokens = tokenize(body)
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[answer_id] = tf
+        self.docs[answer_id] = (type, len(tokens), tuple(counts))
+        self.total_length += len(tokens)
+
+    def _remove(self, answer_id):
+        doc = self.docs.pop(answer_id, None)
+        if doc is not None:
+            self.total_length -= doc[1]
+            for term in doc[2]:
+                self.postings[term].pop(answer_id, None)
+
+    def index(self, answer_id, body, type):
+        with self.lock:
+            self.ensure()
+            self._remove(answer_id)
+            self._add(answer_id, body, type)
+
+    def index_many(self, rows):
+        with self.lock:
+            # An index that was never built will read these rows from the database when it is
+            if self.postings is None:
+                return
+            for answer_id, body, type in rows:
+                self._remove(answer_id)
+                self._add(answer_id, body, type)
+
+    def search(self, terms, type, after, limit):
+        with self.lock:
+            self.ensure()
+            postings = [self.postings.get(term, {}) for term in terms]
+            if not postings or not all(postings):
+                return []
+            n = len(self.docs)
+            avg_length = self.total_length / n
+            smallest = min(postings, key=len)
+            ranked = []
+            for answer_id in smallest:
+                doc_type, length = self.docs[answer_id][:2]
+                if doc_type != type or not all(answer_id in p for p in postings):
+                    continue
+                score = 0.0
+                for p in postings:
+                    tf = p[answer_id]
+                    idf = math.log((n - len(p) + 0.5) / (len(p) + 0.5) + 1)
+                    score += idf * tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * length / avg_length))
+                # Negated like SQLite's bm25() so both backends sort ascending and share cursors
+                ranked.append((-score, answer_id))
+        ranked.sort()
+        if after is not None:
+            ranked = [r for r in ranked if r > (after[0], after[1])]
+        return [(answer_id, rank) for rank, answer_id in ranked[:limit]]
+
+
+def _backend(app):
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') and fts5_available():
+        return Fts5Backend()
+    return InvertedIndexBackend(app.config['ANSWER_SEARCH_SYNC_INTERVAL'], app.config['ANSWER_SEARCH_SYNC_OVERLAP'])
+
+
+def init_app(app):
+    app.extensions['answer_search'] = _backend(app)
+
+
+def backend():
+    return current_app.extensions['answer_search']
+
+
+def index(answer, type):
+    # Call before committing the answer: the FTS5 row is written in the same transaction
+    backend().index(answer.id, answer.body, type)
+
+
+def index_many(rows):
+    # (answer id, body, question type) for answers written in bulk; also call before committing
+    if rows:
+        backend().index_many(rows)
+
+
+def search(query, type, authenticated, after=None, per_page=10):
+    # One page of (answer, author) pairs whose author lets this viewer see profile details,
+    # plus the (rank, id) to resume from or None on the last page
+    terms = tokenize(query)
+    if not terms:
+        return [], None
+    results = []
+    while len(results) < per_page:
+        batch = backend().search(terms, type, after, per_page * 2)
+        if not batch:
+            return results, None
+        ids = [answer_id for answer_id, _ in batch]
+        found = {a.id: (a, u) for a, u in db.session.query(Answer, User).join(User, User.id == Answer.user_id).
+                 options(db.joinedload(Answer.question)).filter(Answer.id.in_(ids))}
+        for answer_id, rank in batch:
+            after = (rank, answer_id)
+            hit = found.get(answer_id)
+            if hit is not None and details_visible(hit[1].privacy, authenticated):
+                results.append(hit)
+                if len(results) == per_page:
+                    break
+    return results, after
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+from threading import Lock
+
+from flask import current_app
+
+from app.jobs import job
+
+# Users without an upload share the default source and therefore its thumbnails
+DEFAULT_DIGEST = 'default'
+DIGEST_RE = re.compile(r'^(?:[0-9a-f]{40}|default)$')
+
+_evict_lock = Lock()
+
+
+def source_path(digest):
+    return os.path.join(current_app.config['AVATAR_SOURCE_DIR'], digest)
+
+
+def cache_path(digest, size):
+    return os.path.join(current_app.config['AVATAR_CACHE_DIR'], '{}_{}.png'.format(digest, size))
+
+
+def etag(digest, size):
+    # Thumbnails are content-addressed, so the digest and size fully identify the bytes
+    return '{}-{}'.format(digest, size)
+
+
+def is_valid(digest, size):
+    return DIGEST_RE.match(digest) is not None and size in current_app.config['AVATAR_SIZES']
+
+
+def save_source(data):
+    # Check once at upload time so broken or oversized files never reach the thumbnail path.
+    # Dimensions come from the header, so a huge image is refused without decoding it
+    from PIL import Image
+    try:
+        image = Image.open(BytesIO(data))
+        width, height = image.size
+        image.verify()
+    except Exception:
+        raise ValueError('Unsupported image file')
+    if width * height > current_app.config['AVATAR_MAX_PIXELS']:
+        raise ValueError('Images cannot be larger than {} megapixels'.format(
+            current_app.config['AVATAR_MAX_PIXELS'] // 1000000))
+    digest = hashlib.sha1(data).hexdigest()
+    path = source_path(digest)
+    if not os.path.exists(path):
+        _atomic_write(path, data)
+    return digest
+
+
+def thumbnail(digest, size):
+    # Return the path of the cached (digest, size) thumbnail, rendering it on the first request only
+    path = cache_path(digest, size)
+    if os.path.exists(path):
+        return path
+
+    from PIL import Image, ImageOps
+    src = source_path(digest)
+    if os.path.exists(src):
+        source = Image.open(src)
+        # Sources saved before uploads were size-checked are not decoded either
+        if source.size[0] * source.size[1] > current_app.config['AVATAR_MAX_PIXELS']:
+            return None
+        img = ImageOps.fit(source.convert('RGB'), (size, size), Image.LANCZOS)
+    elif digest == DEFAULT_DIGEST:
+        img = Image.new('RGB', (size, size), current_app.config['AVATAR_DEFAULT_COLOR'])
+    else:
+        return None
+
+    buf = BytesIO()
+    img.save(buf, format='PNG', optimize=True)
+    _atomic_write(path, buf.getvalue())
+    _evict(current_app.config['AVATAR_CACHE_MAX_BYTES'])
+    return path
+
+
+@job('avatars.warm')
+def warm(digest):
+    # Render every size of a new upload ahead of its first view, off the request path
+    for size in current_app.config['AVATAR_SIZES']:
+        thumbnail(digest, size)
+
+
+def _atomic_write(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _evict(max_bytes):
+    # Drop the oldest thumbnails once the cache directory grows past its byte budget
+    with _evict_lock:
+        entries = []
+        total = 0
+        for entry in os.scandir(current_app.config['AVATAR_CACHE_DIR']):
+            if entry.is_file():
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        if total <= max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
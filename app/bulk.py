@@ -0,0 +1,283 @@
+import csv
+import json
+import os
+import re
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import partial
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from app import db, answer_search
+from app.catalog import questions as catalog, languages as language_catalog
+from app.geo import geo_index, locate
+from app.matching import ROLES, encode_roles, role_bits, role_codes, match_index
+from app.models import User, Answer, UserLanguage
+from app.search import search_index
+
+# Bulk user transfer for the `flask users` commands. Files are read and written one row at a time and the
+# database is touched once per chunk, so memory use depends on the chunk size and never on the file size
+
+# Columns copied as-is between files and the user table; languages and answers are nested
+USER_FIELDS = ('username', 'email', 'gender', 'birthday', 'city', 'state', 'zip_code', 'privacy')
+CSV_FIELDS = USER_FIELDS + ('password', 'password_hash', 'languages', 'answers')
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+ZIP_RE = re.compile(r'^\d{5}$')
+
+Record = namedtuple('Record', 'number user password languages answers')
+
+
+def read_rows(f, format):
+    # (line number, row dict or None when the line cannot be parsed)
+    if format == 'csv':
+        for number, row in enumerate(csv.DictReader(f), 2):
+            try:
+                # Nested values travel as JSON inside a CSV cell
+                for key in ('languages', 'answers'):
+                    row[key] = json.loads(row[key]) if row.get(key) else None
+            except ValueError:
+                row = None
+            yield number, row
+    else:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    yield number, None
+
+
+def _hash(method, salt_length, password):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def _text(row, key, max_length, required=False):
+    value = row.get(key)
+    value = str(value).strip() if value not in (None, '') else None
+    if value is None and required:
+        raise ValueError('{} is required'.format(key))
+    if value is not None and len(value) > max_length:
+        raise ValueError('{} cannot exceed {} characters'.format(key, max_length))
+    return value
+
+
+def _clean(number, row):
+    if not isinstance(row, dict):
+        raise ValueError('not a valid row')
+    user = {
+        'username': _text(row, 'username', 40, required=True),
+        'email': _text(row, 'email', 80, required=True),
+        'gender': _text(row, 'gender', 6),
+        'city': _text(row, 'city', 50),
+        'state': _text(row, 'state', 50),
+        'zip_code': _text(row, 'zip_code', 5),
+        'privacy': _text(row, 'privacy', 1) or '1',
+        'password_hash': _text(row, 'password_hash', 128),
+    }
+    if EMAIL_RE.match(user['email']) is None:
+        raise ValueError('invalid email address')
+    if user['privacy'] not in ('1', '2', '3', '4'):
+        raise ValueError('privacy must be 1, 2, 3 or 4')
+    if user['zip_code'] is not None and ZIP_RE.match(user['zip_code']) is None:
+        raise ValueError('zip codes must be exactly 5 digits')
+    birthday = _text(row, 'birthday', 10)
+    user['birthday'] = date.fromisoformat(birthday) if birthday else None
+    user['latitude'], user['longitude'] = locate(user['zip_code']) or (None, None)
+
+    password = _text(row, 'password', 40)
+    if user['password_hash'] is None and (password is None or len(password) < 8):
+        raise ValueError('a password of 8 to 40 characters or a password_hash is required')
+
+    languages = []
+    selected = {}
+    if not isinstance(row.get('languages') or {}, dict):
+        raise ValueError('languages must map language codes to roles')
+    for code, value in (row.get('languages') or {}).items():
+        language = language_catalog.by_code(code)
+        if language is None:
+            raise ValueError('unknown language {}'.format(code))
+        # Either a list of role codes or {"roles": [...], "body": "..."}
+        roles, body = (value.get('roles'), value.get('body')) if isinstance(value, dict) else (value, None)
+        if not isinstance(roles or [], list) or any(role not in ROLES for role in roles or ()):
+            raise ValueError('roles must be a list of {}'.format(', '.join(ROLES)))
+        if not isinstance(body or '', str) or len(body or '') > 200:
+            raise ValueError('language explanations must be text of up to 200 characters')
+        bits = role_bits(roles)
+        if bits or body:
+            languages.append({'language_id': language.id, 'roles': bits, 'body': body})
+        if bits:
+            selected[language.position] = bits
+    user['language_roles'] = encode_roles(selected)
+
+    answers = {}
+    if not isinstance(row.get('answers') or [], list) or not all(isinstance(a, dict) for a in row.get('answers') or ()):
+        raise ValueError('answers must be a list of {"question", "body"} objects')
+    for answer in row.get('answers') or ():
+        key = answer.get('question')
+        question = catalog.get(key) if isinstance(key, int) else catalog.find(key) if isinstance(key, str) else None
+        if question is None:
+            raise ValueError('unknown question {!r}'.format(key))
+        body = answer.get('body') or ''
+        if not isinstance(body, str) or len(body) > 500:
+            raise ValueError('answers must be text of up to 500 characters')
+        answers[question.id] = body
+    return Record(number, user, password, languages, answers)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_users(rows, chunk_size, workers, report):
+    # rows are (line number, row) pairs from read_rows; report(line number, reason) hears about skipped rows
+    stats = Counter()
+    workers = workers or os.cpu_count()
+    hash_password = partial(_hash, current_app.config['PASSWORD_HASH_METHOD'], current_app.config['PASSWORD_SALT_LENGTH'])
+    with ProcessPoolExecutor(workers) as pool:
+        for chunk in _chunks(rows, chunk_size):
+            _import_chunk(chunk, pool, workers, hash_password, stats, report)
+    return stats
+
+
+def _taken(records):
+    # One query per column for the whole chunk instead of one per row like the registration form
+    if not records:
+        return set(), set()
+    usernames = {record.user['username'] for record in records}
+    emails = {record.user['email'] for record in records}
+    return ({row[0] for row in db.session.query(User.username).filter(User.username.in_(usernames))},
+            {row[0] for row in db.session.query(User.email).filter(User.email.in_(emails))})
+
+
+def _import_chunk(chunk, pool, workers, hash_password, stats, report):
+    records = []
+    for number, row in chunk:
+        try:
+            records.append(_clean(number, row))
+        except ValueError as e:
+            report(number, str(e))
+            stats['invalid'] += 1
+        except (TypeError, AttributeError):
+            report(number, 'malformed row')
+            stats['invalid'] += 1
+
+    taken_usernames, taken_emails = _taken(records)
+    fresh = []
+    for record in records:
+        username, email = record.user['username'], record.user['email']
+        if username in taken_usernames or email in taken_emails:
+            report(record.number, 'username or email already exists')
+            stats['duplicate'] += 1
+            continue
+        # Later rows of the same chunk must not reuse them either
+        taken_usernames.add(username)
+        taken_emails.add(email)
+        fresh.append(record)
+    if not fresh:
+        return
+
+    plain = [record for record in fresh if record.user['password_hash'] is None]
+    hashes = pool.map(hash_password, [record.password for record in plain],
+                      chunksize=max(1, len(plain) // (workers * 4)))
+    for record, password_hash in zip(plain, hashes):
+        record.user['password_hash'] = password_hash
+
+    try:
+        imported = [_insert(fresh)]
+    except IntegrityError:
+        # Another process took a username or email since the check; retry the rows one by one to find which
+        db.session.rollback()
+        imported = []
+        for record in fresh:
+            try:
+                imported.append(_insert([record]))
+            except IntegrityError:
+                db.session.rollback()
+                report(record.number, 'username or email already exists')
+                stats['duplicate'] += 1
+    user_ids = set()
+    for ids, answers in imported:
+        user_ids.update(ids)
+        stats['imported'] += len(ids)
+        stats['answers'] += answers
+    if user_ids:
+        # Core inserts skip the commit hooks, so tell the indexes here; other workers follow their stamps and logs
+        for index in (match_index, search_index, geo_index):
+            index.mark_dirty(user_ids)
+
+
+def _insert(fresh):
+    # Writes and commits the records; returns the new user ids and the number of answers
+    db.session.execute(User.__table__.insert(), [record.user for record in fresh])
+    ids = dict(db.session.query(User.username, User.id).
+               filter(User.username.in_([record.user['username'] for record in fresh])))
+    language_rows = [dict(row, user_id=ids[record.user['username']]) for record in fresh for row in record.languages]
+    if language_rows:
+        db.session.execute(UserLanguage.__table__.insert(), language_rows)
+    answer_rows = [{'user_id': ids[record.user['username']], 'question_id': question_id, 'body': body}
+                   for record in fresh for question_id, body in record.answers.items()]
+    if answer_rows:
+        db.session.execute(Answer.__table__.insert(), answer_rows)
+        # Core inserts skip the session, so mirror the new answers into the search index by hand
+        inserted = db.session.query(Answer.id, Answer.body, Answer.question_id).\
+            filter(Answer.user_id.in_(list(ids.values())))
+        answer_search.index_many([(answer_id, body, catalog.get(question_id).type)
+                                 for answer_id, body, question_id in inserted])
+    db.session.commit()
+    return set(ids.values()), len(answer_rows)
+
+
+def export_users(write, chunk_size):
+    # write(record) receives one dict per user, in id order
+    exported = 0
+    last_id = 0
+    while True:
+        users = User.query.filter(User.id > last_id).order_by(User.id).limit(chunk_size).all()
+        if not users:
+            return exported
+        ids = [user.id for user in users]
+        languages = {}
+        for row in UserLanguage.query.filter(UserLanguage.user_id.in_(ids)):
+            language = language_catalog.get(row.language_id)
+            value = {'roles': role_codes(row.roles), 'body': row.body} if row.body else role_codes(row.roles)
+            languages.setdefault(row.user_id, {})[language.code] = value
+        answers = {}
+        for user_id, question_id, body in db.session.query(Answer.user_id, Answer.question_id, Answer.body).\
+                filter(Answer.user_id.in_(ids)).order_by(Answer.id):
+            # Question bodies are unique and, unlike ids, survive moving between databases
+            answers.setdefault(user_id, []).append({'question': catalog.get(question_id).body, 'body': body})
+        for user in users:
+            record = {field: getattr(user, field) for field in USER_FIELDS}
+            record['birthday'] = user.birthday.isoformat() if user.birthday else None
+            record['password_hash'] = user.password_hash
+            record['languages'] = languages.get(user.id, {})
+            record['answers'] = answers.get(user.id, [])
+            write(record)
+        exported += len(users)
+        last_id = ids[-1]
+        db.session.expunge_all()
+
+
+def jsonl_writer(f):
+    def write(record):
+        f.write(json.dumps(record) + '\n')
+    return write
+
+
+def csv_writer(f):
+    writer = csv.DictWriter(f, CSV_FIELDS)
+    writer.writeheader()
+
+    def write(record):
+        writer.writerow(dict(record, languages=json.dumps(record['languages']), answers=json.dumps(record['answers'])))
+    return write
@@ -0,0 +1,47 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class TTLCache():
+    # Bounded LRU mapping whose entries also expire ttl seconds after they were stored
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = Lock()
+        self.data = OrderedDict()
+
+    def configure(self, maxsize, ttl):
+        with self.lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self.data.clear()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + self.ttl)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def invalidate(self, keys):
+        with self.lock:
+            for key in keys:
+                self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
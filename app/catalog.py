@@ -0,0 +1,215 @@
+import os
+import tempfile
+import time
+from collections import namedtuple
+from threading import Lock
+
+from app import db, events
+from app.extensions import AppLocal
+from app.models import Question, Language
+
+CatalogQuestion = namedtuple('CatalogQuestion', 'id body type')
+CatalogLanguage = namedtuple('CatalogLanguage', 'id code name position')
+
+
+class VersionStamp():
+    # A file whose modification time every worker can compare against the version it loaded.
+    # Checking costs one stat() at most every check_interval seconds and never touches the database
+
+    def __init__(self, path, check_interval):
+        self.path = path
+        self.check_interval = check_interval
+        self.checked = 0
+
+    def read(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def due(self):
+        now = time.monotonic()
+        if now - self.checked < self.check_interval:
+            return False
+        self.checked = now
+        return True
+
+    def bump(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            f.write('{}\n'.format(time.time_ns()))
+        # Guarantee a new mtime even on filesystems with coarse timestamps
+        os.utime(self.path, ns=(time.time_ns(), max(time.time_ns(), self.read() + 1)))
+
+    def advance(self, version):
+        # Bump for a change this process has already applied. A reader holding the current version moves to
+        # the new one; a reader that was behind another worker's bump stays behind and reloads
+        current = self.read()
+        self.bump()
+        return self.read() if version == current else version
+
+
+class ChangeLog():
+    # An append-only file of changed ids shared by every worker: each appends the ids it commits, with its pid,
+    # and reads the lines the others appended since its last look. A change elsewhere then costs a refresh of
+    # those rows instead of a rebuild. Each line is a single O_APPEND write, so concurrent writers never interleave.
+    # A writer that grows the file past max_bytes replaces it with an empty one; readers that see the new file
+    # cannot tell what they missed and reload everything
+
+    def __init__(self, path, check_interval, max_bytes):
+        self.path = path
+        self.check_interval = check_interval
+        self.max_bytes = max_bytes
+        self.checked = 0
+        self.position = None  # (inode, offset) read up to, inode None while there was no file
+
+    def due(self):
+        now = time.monotonic()
+        if now - self.checked < self.check_interval:
+            return False
+        self.checked = now
+        return True
+
+    def append(self, ids):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        line = '{} {}\n'.format(os.getpid(), ' '.join(str(i) for i in sorted(ids))).encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > self.max_bytes:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path))
+            os.close(fd)
+            os.replace(tmp, self.path)
+
+    def start(self):
+        # Skip everything written so far, for a reader about to load the current state from the database
+        try:
+            st = os.stat(self.path)
+            self.position = (st.st_ino, st.st_size)
+        except FileNotFoundError:
+            self.position = (None, 0)
+
+    def read(self):
+        # Ids other processes appended since the last read, or None when the reader must reload everything
+        if self.position is None:
+            self.start()
+            return None
+        known, offset = self.position
+        try:
+            with open(self.path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                if st.st_ino != known:
+                    if known is not None:
+                        # Replaced since the last read: whatever was appended to the old file is lost
+                        self.position = (st.st_ino, st.st_size)
+                        return None
+                    offset = 0
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            self.position = (None, 0)
+            return set() if known is None else None
+        # A line still being written is left for the next read
+        data = data[:data.rfind(b'\n') + 1]
+        self.position = (st.st_ino, offset + len(data))
+        pid = str(os.getpid())
+        ids = set()
+        for line in data.decode().splitlines():
+            fields = line.split()
+            if fields and fields[0] != pid:
+                ids.update(int(field) for field in fields[1:])
+        return ids
+
+
+class Catalog():
+    # A small, rarely edited table held in memory and reloaded only when its stamp moves
+
+    def __init__(self, stamp_setting):
+        self.stamp_setting = stamp_setting  # config key naming the stamp file
+        self.stamp = None
+        self.lock = Lock()
+        self.version = None
+
+    def init_app(self, app):
+        self.stamp = VersionStamp(app.config[self.stamp_setting], app.config['CATALOG_CHECK_INTERVAL'])
+        self.version = None
+
+    def load(self):
+        raise NotImplementedError
+
+    def _fresh(self):
+        with self.lock:
+            if self.version is None or (self.stamp.due() and self.stamp.read() != self.version):
+                version = self.stamp.read()
+                self.load()
+                self.version = version
+
+    def current_version(self):
+        self._fresh()
+        return self.version
+
+    def changed(self, ids=None):
+        self.stamp.bump()
+        with self.lock:
+            self.version = None
+
+
+class QuestionCatalog(Catalog):
+    # Every question grouped by type
+
+    def load(self):
+        rows = db.session.query(Question.id, Question.body, Question.type).order_by(Question.id).all()
+        by_id = {}
+        types = {}
+        for row in rows:
+            question = CatalogQuestion(*row)
+            by_id[question.id] = question
+            types.setdefault(question.type, []).append(question)
+        self.by_id = by_id
+        self.by_body = {question.body: question for question in by_id.values()}
+        self.types = {type: tuple(questions) for type, questions in types.items()}
+
+    def by_type(self, type):
+        self._fresh()
+        return self.types.get(type, ())
+
+    def get(self, id):
+        self._fresh()
+        return self.by_id.get(id)
+
+    def find(self, body):
+        self._fresh()
+        return self.by_body.get(body)
+
+
+class LanguageCatalog(Catalog):
+    # Languages in bit position order; the preferences form is generated from these
+
+    def load(self):
+        rows = db.session.query(Language.id, Language.code, Language.name, Language.position).\
+            order_by(Language.position).all()
+        self.languages = tuple(CatalogLanguage(*row) for row in rows)
+        self.codes = {language.code: language for language in self.languages}
+        self.by_id = {language.id: language for language in self.languages}
+
+    def all(self):
+        self._fresh()
+        return self.languages
+
+    def by_code(self, code):
+        self._fresh()
+        return self.codes.get(code)
+
+    def get(self, id):
+        self._fresh()
+        return self.by_id.get(id)
+
+
+questions = AppLocal('question_catalog', lambda: QuestionCatalog('QUESTION_CATALOG_STAMP'))
+languages = AppLocal('language_catalog', lambda: LanguageCatalog('LANGUAGE_CATALOG_STAMP'))
+
+events.on_commit(Question)(questions.hook('changed'))
+events.on_commit(Language)(languages.hook('changed'))
@@ -0,0 +1,164 @@
+import json
+import os
+import re
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db, bulk, jobs
+from app.catalog import questions as catalog
+from app.forms import UserPreferencesForm
+from app.matching import MAX_LANGUAGES
+from app.models import Question, Language, Job
+
+
+def init_app(app):
+    for group in (questions, languages, users, messages, jobs_group):
+        app.cli.add_command(group)
+
+
+@click.group(cls=AppGroup)
+def questions():
+    """Manage the question catalog."""
+
+
+@questions.command()
+@click.argument('source', type=click.File('r'))
+def seed(source):
+    """Add or update questions from a JSON list or JSON lines file of {"body", "type"} objects."""
+    text = source.read().strip()
+    rows = json.loads(text) if text.startswith('[') else [json.loads(line) for line in text.splitlines() if line.strip()]
+    rows = list({row['body']: row for row in rows}.values())
+    existing = {q.body: q for q in Question.query.filter(Question.body.in_([row['body'] for row in rows]))}
+    new = []
+    updated = 0
+    for row in rows:
+        question = existing.get(row['body'])
+        if question is None:
+            new.append({'body': row['body'], 'type': row['type']})
+        elif question.type != row['type']:
+            question.type = row['type']
+            updated += 1
+    db.session.bulk_insert_mappings(Question, new)
+    db.session.commit()
+    # Bulk inserts skip the session events that normally bump the catalog version
+    catalog.changed()
+    click.echo('Added {} and updated {} questions'.format(len(new), updated))
+
+
+@questions.command()
+def reload():
+    """Make every worker reload the question catalog."""
+    catalog.changed()
+    click.echo('Question catalog version bumped')
+
+
+@click.group(cls=AppGroup)
+def languages():
+    """Manage the languages users can pick in their preferences."""
+
+
+@languages.command()
+@click.argument('code')
+@click.argument('name')
+def add(code, name):
+    """Add a language; it appears in the preferences form without a code change."""
+    # The code names the language's form fields, code and code_body, so it must not shadow anything on the form
+    if not re.match(r'^[a-z][a-z_]*$', code) or len(code) > 20:
+        raise click.ClickException('Codes are up to 20 lowercase letters and underscores, starting with a letter')
+    codes = {row[0] for row in db.session.query(Language.code)}
+    fields = {code, code + '_body'}
+    taken = {'csrf_token', 'meta'} | codes | {existing + '_body' for existing in codes}
+    if any(hasattr(UserPreferencesForm, field) or field in taken for field in fields):
+        raise click.ClickException('{} clashes with an existing language or preferences form attribute'.format(code))
+    positions = [row[0] for row in db.session.query(Language.position)]
+    position = max(positions, default=-1) + 1
+    if position >= MAX_LANGUAGES:
+        raise click.ClickException('Only {} languages fit in User.language_roles'.format(MAX_LANGUAGES))
+    db.session.add(Language(code=code, name=name, position=position))
+    db.session.commit()
+    click.echo('Added {} at bit position {}'.format(name, position))
+
+
+@click.group(cls=AppGroup)
+def users():
+    """Import and export users with their languages and answers."""
+
+
+def _file_format(path, format):
+    return format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+
+
+@users.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['jsonl', 'csv']), help='Defaults to csv for .csv files, else jsonl.')
+@click.option('--chunk-size', default=500, show_default=True, help='Rows per bulk insert and commit.')
+@click.option('--workers', type=int, help='Password hashing processes, one per CPU by default.')
+def import_users(path, format, chunk_size, workers):
+    """Add users from a JSON lines or CSV file, skipping invalid rows and existing usernames or emails.
+
+    Each row has the user columns, a plain password or an existing password_hash, languages as
+    {"code": ["sp", "st"]} and answers as [{"question": id or body, "body": "..."}].
+    """
+    def report(number, reason):
+        click.echo('Skipped line {}: {}'.format(number, reason), err=True)
+
+    with open(path, newline='', encoding='utf-8') as f:
+        stats = bulk.import_users(bulk.read_rows(f, _file_format(path, format)), chunk_size, workers, report)
+    click.echo('Imported {} users with {} answers; skipped {} existing and {} invalid rows'.format(
+        stats['imported'], stats['answers'], stats['duplicate'], stats['invalid']))
+
+
+@users.command('export')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', type=click.Choice(['jsonl', 'csv']), help='Defaults to csv for .csv files, else jsonl.')
+@click.option('--chunk-size', default=500, show_default=True, help='Users loaded per query.')
+def export_users(path, format, chunk_size):
+    """Write every user with their languages and answers; password hashes are exported, never passwords."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = bulk.csv_writer(f) if _file_format(path, format) == 'csv' else bulk.jsonl_writer(f)
+        count = bulk.export_users(writer, chunk_size)
+    click.echo('Exported {} users to {}'.format(count, os.path.basename(path)))
+
+
+@click.group(cls=AppGroup)
+def messages():
+    """Deliver messages to browsers."""
+
+
+@messages.command()
+@click.option('--host', help='Defaults to MESSAGE_STREAM_HOST.')
+@click.option('--port', type=int, help='Defaults to MESSAGE_STREAM_PORT.')
+def stream(host, port):
+    """Run the server-sent events endpoint that pushes new messages to open pages."""
+    host = host or current_app.config['MESSAGE_STREAM_HOST']
+    port = port or current_app.config['MESSAGE_STREAM_PORT']
+    from app.message_stream import run
+    click.echo('Streaming messages on http://{}:{}/stream'.format(host, port))
+    run(host, port)
+
+
+@click.group('jobs', cls=AppGroup)
+def jobs_group():
+    """Run and inspect background jobs."""
+
+
+@jobs_group.command()
+@click.option('--workers', type=int, help='Jobs run at once, JOBS_WORKERS by default.')
+@click.option('--processes', is_flag=True, help='Run jobs in child processes instead of threads.')
+@click.option('--once', is_flag=True, help='Exit once no job is due instead of waiting for more.')
+def work(workers, processes, once):
+    """Run queued jobs, retrying failures with exponential backoff."""
+    workers = workers or current_app.config['JOBS_WORKERS']
+    click.echo('Running jobs with {} {}'.format(workers, 'processes' if processes else 'threads'))
+    jobs.work(workers, processes, once)
+
+
+@jobs_group.command()
+def status():
+    """Count jobs by name and state."""
+    rows = db.session.query(Job.name, Job.state, db.func.count(Job.id)).group_by(Job.name, Job.state).\
+        order_by(Job.name, Job.state)
+    for name, state, count in rows:
+        click.echo('{:<30} {:<8} {}'.format(name, state, count))
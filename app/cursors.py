@@ -0,0 +1,16 @@
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+
+
+# Opaque, signed pagination cursors: clients can hand them back but cannot forge or edit them
+def encode(values, salt):
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=salt).dumps(list(values))
+
+
+def decode(token, salt):
+    if not token:
+        return None
+    try:
+        return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=salt).loads(token)
+    except BadSignature:
+        return None
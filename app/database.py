@@ -0,0 +1,29 @@
+import sqlite3
+from functools import partial
+
+from sqlalchemy import event
+
+from app import db
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute('PRAGMA {} = {}'.format(name, value))
+    cursor.close()
+
+
+def init_app(app):
+    # Listens on this app's engine only, so apps with other profiles in the same process keep their settings
+    if app.config['DATABASE_PROFILE'] == 'production':
+        pragmas = dict(app.config['SQLITE_PRAGMAS'])
+        # The journal mode is stored in the database file, so the engine's first connection sets it for every other
+        journal_mode = {'journal_mode': pragmas.pop('journal_mode')} if 'journal_mode' in pragmas else {}
+        engine = db.get_engine(app)
+        event.listen(engine, 'first_connect', partial(_on_connect, journal_mode))
+        event.listen(engine, 'connect', partial(_on_connect, pragmas))
+
+
+def _on_connect(pragmas, dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
@@ -0,0 +1,53 @@
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import event, inspect
+
+from app import db
+
+# Subscribers are told which rows changed once the transaction that changed them commits.
+# Keys are captured at flush time, while new rows already have ids and deleted rows are still readable
+_subscriptions = []
+
+
+def on_commit(model, key=lambda obj: obj.id, columns=None):
+    # columns limits updates (not inserts or deletes) to changes of the named attributes
+    def decorator(callback):
+        _subscriptions.append((model, key, columns, callback))
+        return callback
+    return decorator
+
+
+def _changed(obj, columns):
+    attrs = inspect(obj).attrs
+    return any(attrs[column].history.has_changes() for column in columns)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect(session, flush_context):
+    pending = session.info.setdefault('changed_keys', {})
+    for obj in chain(session.new, session.deleted):
+        for i, (model, key, _, _) in enumerate(_subscriptions):
+            if isinstance(obj, model):
+                pending.setdefault(i, set()).add(key(obj))
+    for obj in session.dirty:
+        for i, (model, key, columns, _) in enumerate(_subscriptions):
+            if isinstance(obj, model) and (columns is None or _changed(obj, columns)):
+                pending.setdefault(i, set()).add(key(obj))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _dispatch(session):
+    pending = session.info.pop('changed_keys', None)
+    for i, keys in (pending or {}).items():
+        keys.discard(None)
+        if keys:
+            try:
+                _subscriptions[i][3](keys)
+            except Exception:
+                current_app.logger.exception('Commit subscriber %s failed', _subscriptions[i][3].__name__)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard(session, previous_transaction):
+    session.info.pop('changed_keys', None)
@@ -0,0 +1,28 @@
+from flask import current_app
+
+
+class AppLocal():
+    # Module-level handle on an object each app owns. init_app builds the app's own instance and keeps it in
+    # app.extensions; attribute access goes to the current app's instance, the way Flask extensions find their state
+
+    def __init__(self, name, factory):
+        self.__dict__.update(_name=name, _factory=factory)
+
+    def init_app(self, app):
+        instance = self._factory()
+        instance.init_app(app)
+        app.extensions[self._name] = instance
+        return instance
+
+    def hook(self, method):
+        # Commit hooks are registered at import time, before any app exists, so they look the instance up per call
+        def call(keys):
+            return getattr(current_app.extensions[self._name], method)(keys)
+        call.__name__ = '{}.{}'.format(self._name, method)
+        return call
+
+    def __getattr__(self, attr):
+        return getattr(current_app.extensions[self._name], attr)
+
+    def __setattr__(self, attr, value):
+        setattr(current_app.extensions[self._name], attr, value)
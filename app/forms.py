@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from app.models import User
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, TextAreaField, SelectField, SelectMultipleField
 from wtforms.fields.html5 import DateField
@@ -36,19 +37,53 @@ class AnswerForm(FlaskForm):
     submit = SubmitField('Submit')
 
 
+class AvatarForm(FlaskForm):
+    image = FileField('Profile picture', validators=[FileRequired(), FileAllowed(['jpg', 'jpeg', 'png', 'gif'], 'Images only!')])
+    submit = SubmitField('Upload')
+
+
+class MessageForm(FlaskForm):
+    body = TextAreaField('', validators=[InputRequired(), Length(max=1000, message='Messages cannot exceed 1000 characters')])
+    submit = SubmitField('Send')
+
+
+class LikeForm(FlaskForm):
+    submit = SubmitField('Like')
+
+
+class ThreadForm(FlaskForm):
+    title = StringField('Title', validators=[InputRequired(), Length(max=140, message='Titles cannot exceed 140 characters')])
+    body = TextAreaField('', validators=[InputRequired(), Length(max=2000, message='Posts cannot exceed 2000 characters')])
+    submit = SubmitField('Start thread')
+
+
+class PostForm(FlaskForm):
+    body = TextAreaField('', validators=[InputRequired(), Length(max=2000, message='Posts cannot exceed 2000 characters')])
+    submit = SubmitField('Reply')
+
+
+ROLE_CHOICES = [('sp', 'Fluent speaker'), ('st', 'Student'), ('t', 'Teacher'), ('o', 'Other')]
+
+
 class UserPreferencesForm(FlaskForm):
-    other_fields = {}
-    english = SelectMultipleField('English', choices=[('sp', 'Fluent speaker'), ('st', 'Student'), ('t', 'Teacher'), ('o', 'Other')])
-    english_body = TextAreaField('', validators=[Length(min=0, max=200)])
-    french = SelectMultipleField('French', choices=[('sp', 'Fluent speaker'), ('st', 'Student'), ('t', 'Teacher'), ('o', 'Other')])
-    french_body = TextAreaField('', validators=[Length(min=0, max=200)])
-    german = SelectMultipleField('German', choices=[('sp', 'Fluent speaker'), ('st', 'Student'), ('t', 'Teacher'), ('o', 'Other')])
-    german_body = TextAreaField('', validators=[Length(min=0, max=200)])
-    spanish = SelectMultipleField('Spanish', choices=[('sp', 'Fluent speaker'), ('st', 'Student'), ('t', 'Teacher'), ('o', 'Other')])
-    spanish_body = TextAreaField('', validators=[Length(min=0, max=200)])
     submit = SubmitField('Submit')
 
 
+_preference_forms = {}
+
+
+# Build (once per set of languages) a form with a role picker and an explanation box for each language
+def preferences_form(languages):
+    form_class = _preference_forms.get(languages)
+    if form_class is None:
+        attrs = {}
+        for language in languages:
+            attrs[language.code] = SelectMultipleField(language.name, choices=ROLE_CHOICES)
+            attrs[language.code + '_body'] = TextAreaField('', validators=[Length(min=0, max=200)])
+        form_class = _preference_forms[languages] = type('UserPreferencesForm', (UserPreferencesForm,), attrs)
+    return form_class()
+
+
 class UserSettingsForm(FlaskForm):
     email = StringField('Email', validators=[InputRequired(), Email(), Length(max=80, message='Email address cannot exceed 80 characters')])
     username = StringField('Username', validators=[InputRequired(), Length(max=40, message='Username cannot exceed 40 characters')])
@@ -77,9 +112,6 @@ class UserSettingsForm(FlaskForm):
             if user is not None:
                 raise ValidationError('Username has already been taken by another user')
 
-    def validate_zipcode(self, zip_code):
-        if len(zip_code != 0 or zip_code != 5):
-            raise ValidationError('Zip codes must be exactly 5 characters!')
-        if len(zip_code == 5):
-            if re.match('\d{5}', zip_code) is None:
-                raise ValidationError('Zip codes may only contain digits!')
+    def validate_zip_code(self, zip_code):
+        if zip_code.data and re.fullmatch(r'\d{5}', zip_code.data) is None:
+            raise ValidationError('Zip codes must be exactly 5 digits!')
@@ -0,0 +1,99 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from threading import Lock
+
+from app import db
+from app.cache import TTLCache
+from app.extensions import AppLocal
+from app.models import User, Thread, Post
+
+HotThread = namedtuple('HotThread', 'id title language_id reply_count last_activity author')
+
+HOT_CANDIDATES = 1000  # most recently active threads scored for the ranking
+
+
+def create_thread(language_id, user_id, title, body):
+    now = datetime.utcnow()
+    thread = Thread(language_id=language_id, user_id=user_id, title=title, created=now, last_activity=now,
+                    reply_count=0)
+    db.session.add(thread)
+    db.session.flush()
+    db.session.add(Post(thread_id=thread.id, user_id=user_id, body=body, timestamp=now))
+    return thread
+
+
+# Add a reply and bump the thread's counters in the caller's transaction. The increment happens in SQL so
+# concurrent replies cannot overwrite each other's count
+def reply(thread_id, user_id, body):
+    now = datetime.utcnow()
+    post = Post(thread_id=thread_id, user_id=user_id, body=body, timestamp=now)
+    db.session.add(post)
+    Thread.query.filter(Thread.id == thread_id).\
+        update({'reply_count': Thread.reply_count + 1, 'last_activity': now}, synchronize_session=False)
+    return post
+
+
+# Keyset page of (thread, author username) in a language, most recently active first.
+# after is the (last_activity, id) of the previous page's final thread
+def threads(language_id, limit, after=None):
+    query = db.session.query(Thread, User.username).join(User, User.id == Thread.user_id).\
+        filter(Thread.language_id == language_id)
+    if after is not None:
+        last_activity, id = after
+        query = query.filter(db.or_(Thread.last_activity < last_activity,
+                                    db.and_(Thread.last_activity == last_activity, Thread.id < id)))
+    page = query.order_by(Thread.last_activity.desc(), Thread.id.desc()).limit(limit).all()
+    last = (page[-1][0].last_activity, page[-1][0].id) if len(page) == limit else None
+    return page, last
+
+
+# Keyset page of (post, author username) in posting order, after the given post id
+def posts(thread_id, limit, after=None):
+    query = db.session.query(Post, User.username).join(User, User.id == Post.user_id).\
+        filter(Post.thread_id == thread_id)
+    if after is not None:
+        query = query.filter(Post.id > after)
+    page = query.order_by(Post.id).limit(limit).all()
+    return page, page[-1][0].id if len(page) == limit else None
+
+
+class HotThreads():
+    # Ranked threads per language (None for the whole forum), recomputed at most once per interval.
+    # Entries are plain tuples so every request can share them
+
+    def __init__(self):
+        self.cache = TTLCache(0, 0)
+        self.lock = Lock()
+
+    def init_app(self, app):
+        self.window = timedelta(days=app.config['FORUM_HOT_WINDOW'])
+        self.limit = app.config['FORUM_HOT_LIMIT']
+        self.cache.configure(1024, app.config['FORUM_HOT_INTERVAL'])
+
+    def get(self, language_id=None):
+        ranked = self.cache.get(language_id)
+        if ranked is None:
+            # One request recomputes while the others wait for its result instead of repeating the query
+            with self.lock:
+                ranked = self.cache.get(language_id)
+                if ranked is None:
+                    ranked = self._rank(language_id)
+                    self.cache.set(language_id, ranked)
+        return ranked
+
+    def _rank(self, language_id):
+        now = datetime.utcnow()
+        query = db.session.query(Thread.id, Thread.title, Thread.language_id, Thread.reply_count,
+                                 Thread.last_activity, User.username, Thread.created).\
+            join(User, User.id == Thread.user_id).\
+            filter(Thread.last_activity >= now - self.window)
+        if language_id is not None:
+            query = query.filter(Thread.language_id == language_id)
+        rows = query.order_by(Thread.last_activity.desc()).limit(HOT_CANDIDATES).all()
+        # Replies push a thread up, age pulls it down
+        scored = sorted(rows, key=lambda row: (row.reply_count + 1) /
+                        ((now - row.created).total_seconds() / 3600 + 2) ** 1.5, reverse=True)
+        return tuple(HotThread(*row[:6]) for row in scored[:self.limit])
+
+
+hot_threads = AppLocal('hot_threads', HotThreads)
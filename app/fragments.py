@@ -0,0 +1,80 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+from app.extensions import AppLocal
+
+
+class LocalBackend():
+    # In-process LRU bounded by the encoded size of the cached fragments
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.data = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.data.get(key)
+            if value is not None:
+                self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.data.pop(key, None)
+            if old is not None:
+                self.size -= len(old.encode('utf-8'))
+            self.data[key] = value
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self.data.popitem(last=False)
+                self.size -= len(evicted.encode('utf-8'))
+
+
+class RedisBackend():
+    # Any server speaking the Redis protocol; fragments expire so an LRU maxmemory policy can reclaim them
+
+    def __init__(self, url, ttl):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(key, value.encode('utf-8'), ex=self.ttl)
+
+
+class FragmentCache():
+    # Rendered profile bodies keyed by the profile's content version, the viewer class and the catalog version.
+    # The content version is read from the database on every request (see models.profile_version), so an edit
+    # committed by any worker changes the key at once and stale entries are simply never read again
+
+    def __init__(self):
+        self.backend = None
+
+    def init_app(self, app):
+        if app.config['FRAGMENT_CACHE_BACKEND'] == 'redis':
+            self.backend = RedisBackend(app.config['FRAGMENT_CACHE_URL'], app.config['FRAGMENT_CACHE_TTL'])
+        else:
+            self.backend = LocalBackend(app.config['FRAGMENT_CACHE_MAX_BYTES'])
+
+    def _key(self, version, viewer, catalog_version):
+        digest = hashlib.sha1(repr(tuple(version)).encode()).hexdigest()
+        return 'profile:{}:{}:{}:{}'.format(version[0], digest, viewer, catalog_version)
+
+    def get(self, version, viewer, catalog_version):
+        return self.backend.get(self._key(version, viewer, catalog_version))
+
+    def set(self, version, viewer, catalog_version, html):
+        self.backend.set(self._key(version, viewer, catalog_version), html)
+
+
+fragments = AppLocal('fragments', FragmentCache)
@@ -0,0 +1,146 @@
+import csv
+import math
+from threading import Lock
+
+import numpy as np
+from flask import current_app
+
+from app import db, events
+from app.catalog import VersionStamp
+from app.extensions import AppLocal
+from app.models import User
+from app.search import is_searchable
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = 69.17
+
+_centroids = {}  # GEO_ZIP_TABLE path -> {zip code: (lat, lon)}
+_centroids_lock = Lock()
+
+
+def _load_centroids(path):
+    # Accepts the bundled zip,latitude,longitude CSV or a Census ZCTA gazetteer file (tab separated)
+    table = {}
+    with open(path, newline='') as f:
+        delimiter = '\t' if '\t' in f.readline() else ','
+        f.seek(0)
+        for row in csv.DictReader(f, delimiter=delimiter):
+            row = {k.strip(): v.strip() for k, v in row.items() if k}
+            zip_code = row.get('zip') or row.get('GEOID')
+            lat = row.get('latitude') or row.get('INTPTLAT')
+            lon = row.get('longitude') or row.get('INTPTLONG')
+            if zip_code and lat and lon:
+                table[zip_code.zfill(5)] = (float(lat), float(lon))
+    return table
+
+
+def locate(zip_code):
+    if not zip_code:
+        return None
+    path = current_app.config['GEO_ZIP_TABLE']
+    table = _centroids.get(path)
+    if table is None:
+        with _centroids_lock:
+            table = _centroids.get(path)
+            if table is None:
+                table = _centroids[path] = _load_centroids(path)
+    return table.get(zip_code)
+
+
+def _cell(lat, lon, size):
+    return int(math.floor(lat / size)), int(math.floor(lon / size))
+
+
+def haversine(lat, lon, lats, lons):
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoIndex():
+    # Fixed-size lat/lon grid: a query only measures distances to users in the cells its radius overlaps.
+    # Kept in step with other workers the way the search index is, through its own stamp
+
+    def __init__(self):
+        self.lock = Lock()
+        self.cells = None
+        self.points = {}  # user id -> (lat, lon)
+        self.dirty = set()
+        self.stamp = None
+        self.version = None
+
+    def init_app(self, app):
+        self.cell_degrees = app.config['GEO_CELL_DEGREES']
+        self.stamp = VersionStamp(app.config['GEO_INDEX_STAMP'], app.config['USER_INDEX_CHECK_INTERVAL'])
+        self.cells = None
+
+    def build(self):
+        rows = db.session.query(User.id, User.latitude, User.longitude, User.privacy).\
+            filter(User.latitude.isnot(None)).all()
+        self.cells = {}
+        self.points = {}
+        for uid, lat, lon, privacy in rows:
+            if is_searchable(privacy):
+                self._add(uid, lat, lon)
+        self.dirty = set()
+
+    def _add(self, uid, lat, lon):
+        self.points[uid] = (lat, lon)
+        self.cells.setdefault(_cell(lat, lon, self.cell_degrees), {})[uid] = (lat, lon)
+
+    def _remove(self, uid):
+        point = self.points.pop(uid, None)
+        if point is not None:
+            self.cells[_cell(point[0], point[1], self.cell_degrees)].pop(uid, None)
+
+    def mark_dirty(self, user_ids):
+        with self.lock:
+            self.dirty |= user_ids
+            self.version = self.stamp.advance(self.version)
+
+    def _sync(self):
+        if self.cells is None or (self.stamp.due() and self.stamp.read() != self.version):
+            self.version = self.stamp.read()
+            self.build()
+        elif self.dirty:
+            user_ids, self.dirty = self.dirty, set()
+            rows = db.session.query(User.id, User.latitude, User.longitude, User.privacy).\
+                filter(User.id.in_(user_ids)).all()
+            for uid in user_ids:
+                self._remove(uid)
+            for uid, lat, lon, privacy in rows:
+                if lat is not None and is_searchable(privacy):
+                    self._add(uid, lat, lon)
+
+    def _candidates(self, lat, lon, radius):
+        size = self.cell_degrees
+        dlat = radius / MILES_PER_DEGREE
+        dlon = radius / (MILES_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        lat_lo, lon_lo = _cell(lat - dlat, lon - dlon, size)
+        lat_hi, lon_hi = _cell(lat + dlat, lon + dlon, size)
+        ids = []
+        coords = []
+        for i in range(lat_lo, lat_hi + 1):
+            for j in range(lon_lo, lon_hi + 1):
+                cell = self.cells.get((i, j))
+                if cell:
+                    ids.extend(cell.keys())
+                    coords.extend(cell.values())
+        return np.array(ids, dtype=np.int64), np.array(coords, dtype=np.float64).reshape(-1, 2)
+
+    def within(self, lat, lon, radius, exclude=None):
+        # Users within radius miles, nearest first, as (user id, distance) pairs
+        with self.lock:
+            self._sync()
+            ids, coords = self._candidates(lat, lon, radius)
+        if not len(ids):
+            return []
+        distance = haversine(lat, lon, coords[:, 0], coords[:, 1])
+        keep = np.flatnonzero((distance <= radius) & (ids != (exclude or 0)))
+        keep = keep[np.argsort(distance[keep], kind='stable')]
+        return [(int(ids[i]), float(distance[i])) for i in keep]
+
+
+geo_index = AppLocal('geo_index', GeoIndex)
+
+events.on_commit(User, columns=('latitude', 'longitude', 'privacy'))(geo_index.hook('mark_dirty'))
@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import os
+import time
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Conditional GETs for read-mostly pages and compression of every large text response.
+# Pages are validated with weak ETags: a gzip or brotli body is the same page, so compression never changes them
+COMPRESSIBLE = ('text/html', 'text/plain', 'text/css', 'application/json', 'application/javascript')
+
+
+def init_app(app):
+    app.extensions['http_cache'] = _template_stamp(app)
+    app.after_request(compress)
+
+
+def _template_stamp(app):
+    # Moves when any template is edited or deployed, so browsers revalidating pages made from the old ones re-download
+    stamp = hashlib.sha1()
+    for root, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            stamp.update('{}:{}:{}'.format(name, stat.st_mtime_ns, stat.st_size).encode())
+    return stamp.hexdigest()
+
+
+def etag(*versions):
+    # Validator for a page described by versions of its content. It also varies with the viewer and their session's
+    # CSRF secret, and rolls over every half CSRF lifetime so a revalidated form never carries an expired token
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    epoch = int(time.time() // (limit / 2)) if limit else 0
+    parts = (current_app.extensions['http_cache'], current_user.get_id(), session.get('csrf_token'), epoch, versions)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def conditional(tag, render):
+    # The page rendered by render() with tag as its validator, or 304 Not Modified without rendering it when the
+    # browser already has that version. A pending flashed message is shown by the next page only, so that page
+    # is neither validated nor given a validator
+    if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+        return render()
+    if request.if_none_match.contains_weak(tag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(tag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def compress(response):
+    config = current_app.config
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed or \
+            'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE:
+        return response
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+    response.vary.add('Accept-Encoding')
+    if brotli is not None and request.accept_encodings['br']:
+        response.set_data(brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY']))
+        response.headers['Content-Encoding'] = 'br'
+    elif request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
@@ -0,0 +1,156 @@
+import hmac
+import re
+from threading import Lock
+from time import perf_counter
+
+from flask import abort, current_app, g, has_app_context, has_request_context, request, request_started, \
+    request_finished, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import metrics
+from app.metrics import Counter, Gauge, Histogram
+
+request_seconds = Histogram('langmatch_request_seconds', 'Request handling time by endpoint')
+request_queries = Histogram('langmatch_request_queries', 'SQL statements executed per request by endpoint',
+                            buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250))
+request_sql_seconds = Histogram('langmatch_request_sql_seconds', 'Time spent in SQL per request by endpoint')
+request_template_seconds = Histogram('langmatch_request_template_seconds',
+                                     'Time spent rendering templates per request by endpoint')
+slow_requests = Counter('langmatch_slow_requests_total', 'Requests slower than SLOW_REQUEST_THRESHOLD by endpoint')
+slowest_statements = Gauge('langmatch_sql_slowest_statement_seconds',
+                           'Longest single execution of each of the slowest SQL statements seen by this worker')
+
+# Expanded IN lists would otherwise make every list length its own statement
+_PLACEHOLDER_LIST = re.compile(r'(\?|%\(\w+\)s)(\s*,\s*(\?|%\(\w+\)s))+')
+_WHITESPACE = re.compile(r'\s+')
+
+_slowest = {}  # normalised statement -> seconds
+_slowest_floor = 0.0  # fastest tracked time once the table is full, checked without the lock
+_slowest_lock = Lock()
+_slowest_limit = 20  # SLOW_STATEMENTS_TRACKED, for engines used outside any app
+
+
+def init_app(app):
+    request_started.connect(_on_request_started, app)
+    before_render_template.connect(_on_before_render, app)
+    template_rendered.connect(_on_rendered, app)
+    request_finished.connect(_on_request_finished, app)
+    app.add_url_rule('/metrics', 'prometheus_metrics', prometheus_metrics)
+
+
+def prometheus_metrics():
+    if not _may_scrape():
+        abort(404)
+    return current_app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _may_scrape():
+    config = current_app.config
+    token = config['METRICS_TOKEN']
+    expected = 'Bearer {}'.format(token).encode()
+    if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+        return True
+    return request.remote_addr in config['METRICS_ALLOWED_IPS']
+
+
+class RequestStats():
+    __slots__ = ('started', 'queries', 'sql_seconds', 'template_seconds', 'slowest', 'slowest_seconds', '_templates')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.slowest = None
+        self.slowest_seconds = 0.0
+        self._templates = []
+
+
+def _normalise(statement):
+    return _PLACEHOLDER_LIST.sub('...', _WHITESPACE.sub(' ', statement).strip())[:300]
+
+
+def _track_statement(statement, seconds):
+    global _slowest_floor
+    limit = current_app.config['SLOW_STATEMENTS_TRACKED'] if has_app_context() else _slowest_limit
+    with _slowest_lock:
+        key = _normalise(statement)
+        if seconds <= _slowest.get(key, 0.0):
+            return
+        _slowest[key] = seconds
+        slowest_statements.set(seconds, statement=key)
+        if len(_slowest) > limit:
+            fastest = min(_slowest, key=_slowest.get)
+            del _slowest[fastest]
+            slowest_statements.remove(statement=fastest)
+        if len(_slowest) >= limit:
+            _slowest_floor = min(_slowest.values())
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = perf_counter() - conn.info['query_started'].pop()
+    if seconds > _slowest_floor:
+        _track_statement(statement, seconds)
+    # Background threads (match index, presence flush) run queries outside any request
+    stats = g.get('request_stats') if has_request_context() else None
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += seconds
+        if seconds > stats.slowest_seconds:
+            stats.slowest, stats.slowest_seconds = statement, seconds
+
+
+@event.listens_for(Engine, 'handle_error')
+def _on_statement_error(context):
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _on_request_started(sender, **extra):
+    g.request_stats = RequestStats()
+
+
+def _on_before_render(sender, template, context, **extra):
+    stats = g.get('request_stats')
+    if stats is not None:
+        stats._templates.append(perf_counter())
+
+
+def _on_rendered(sender, template, context, **extra):
+    stats = g.get('request_stats')
+    if stats is not None and stats._templates:
+        # Templates rendered from inside another template only count once, as part of the outer one
+        started = stats._templates.pop()
+        if not stats._templates:
+            stats.template_seconds += perf_counter() - started
+
+
+def _on_request_finished(sender, response, **extra):
+    stats = g.get('request_stats')
+    if stats is None:
+        return
+    seconds = perf_counter() - stats.started
+    endpoint = request.endpoint or 'unmatched'
+    request_seconds.observe(seconds, endpoint=endpoint)
+    request_queries.observe(stats.queries, endpoint=endpoint)
+    request_sql_seconds.observe(stats.sql_seconds, endpoint=endpoint)
+    request_template_seconds.observe(stats.template_seconds, endpoint=endpoint)
+
+    if current_app.config['SERVER_TIMING']:
+        response.headers.add('Server-Timing', 'sql;dur={:.1f};desc="{} queries", tpl;dur={:.1f}, app;dur={:.1f}'.format(
+            stats.sql_seconds * 1000, stats.queries, stats.template_seconds * 1000, seconds * 1000))
+
+    if seconds >= current_app.config['SLOW_REQUEST_THRESHOLD']:
+        slow_requests.inc(endpoint=endpoint)
+        current_app.logger.warning('Slow request %s %s: %.0f ms, %d queries in %.0f ms, templates %.0f ms, slowest '
+                                   'query %.0f ms: %s', request.method, request.path, seconds * 1000, stats.queries,
+                                   stats.sql_seconds * 1000, stats.template_seconds * 1000,
+                                   stats.slowest_seconds * 1000, _normalise(stats.slowest) if stats.slowest else '-')
@@ -0,0 +1,175 @@
+import json
+import multiprocessing
+import random
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from functools import partial
+
+from flask import current_app
+
+from app import db
+from app.models import Job
+
+# Registered job functions by name. Jobs are stored by name with JSON keyword arguments, so a function
+# must be importable from app (registered at import time) in every process that runs workers
+_registry = {}
+
+
+class UnknownJob(Exception):
+    pass
+
+
+def job(name, max_attempts=None):
+    def decorator(fn):
+        _registry[name] = (fn, max_attempts)
+        fn.job_name = name
+        return fn
+    return decorator
+
+
+def enqueue(name, delay=0, **kwargs):
+    # Adds the job to the caller's transaction, so it only becomes visible to workers if the caller commits
+    if name not in _registry:
+        raise UnknownJob(name)
+    fn, max_attempts = _registry[name]
+    max_attempts = max_attempts or current_app.config['JOBS_MAX_ATTEMPTS']
+    if current_app.config['JOBS_BACKEND'] == 'memory':
+        _run_inline(name, fn, kwargs, max_attempts)
+        return None
+    entry = Job(name=name, payload=json.dumps(kwargs), state='queued', attempts=0, max_attempts=max_attempts,
+                run_at=datetime.utcnow() + timedelta(seconds=delay))
+    db.session.add(entry)
+    return entry
+
+
+def _run_inline(name, fn, kwargs, max_attempts):
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return fn(**kwargs)
+        except Exception:
+            if attempt == max_attempts:
+                current_app.logger.exception('Job %s failed after %d attempts', name, attempt)
+
+
+def backoff(attempts):
+    # Exponential with jitter so jobs that failed together do not retry in lockstep
+    delay = min(current_app.config['JOBS_BACKOFF'] * 2 ** (attempts - 1), current_app.config['JOBS_BACKOFF_MAX'])
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim(limit):
+    # Ids of up to `limit` due jobs now marked running by this worker. The conditional UPDATE is the lock:
+    # of several workers racing for a row, only the one whose UPDATE matched it runs the job
+    now = datetime.utcnow()
+    candidates = [row[0] for row in db.session.query(Job.id).
+                  filter(Job.state == 'queued', Job.run_at <= now).order_by(Job.run_at).limit(limit * 2)]
+    claimed = []
+    for job_id in candidates:
+        updated = Job.query.filter(Job.id == job_id, Job.state == 'queued').\
+            update({'state': 'running', 'locked_at': now, 'attempts': Job.attempts + 1}, synchronize_session=False)
+        db.session.commit()
+        if updated:
+            claimed.append(job_id)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def requeue_stale():
+    # Running jobs whose worker died never finish; give them back to the queue. A job that has used up its
+    # attempts may be what killed the worker (e.g. out of memory), so it fails instead of crashing the next one
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['JOBS_LOCK_TIMEOUT'])
+    stale = Job.query.filter(Job.state == 'running', Job.locked_at < cutoff)
+    failed = stale.filter(Job.attempts >= Job.max_attempts).\
+        update({'state': 'failed', 'locked_at': None, 'last_error': 'Worker died while running the job'},
+               synchronize_session=False)
+    count = stale.update({'state': 'queued', 'locked_at': None}, synchronize_session=False)
+    db.session.commit()
+    if failed:
+        current_app.logger.error('%d stale jobs failed after their last attempt', failed)
+    return count
+
+
+def run_job(app, job_id):
+    # Executes one claimed job and records the outcome; safe to call from a thread or a child process
+    with app.app_context():
+        try:
+            entry = Job.query.get(job_id)
+            if entry is None:
+                return None
+            fn, _ = _registry.get(entry.name, (None, None))
+            try:
+                if fn is None:
+                    raise UnknownJob(entry.name)
+                fn(**json.loads(entry.payload or '{}'))
+            except Exception:
+                db.session.rollback()
+                entry = Job.query.get(job_id)
+                entry.last_error = traceback.format_exc()
+                if entry.attempts < entry.max_attempts:
+                    entry.state = 'queued'
+                    entry.run_at = datetime.utcnow() + timedelta(seconds=backoff(entry.attempts))
+                else:
+                    entry.state = 'failed'
+                    app.logger.error('Job %s %d failed after %d attempts', entry.name, job_id, entry.attempts)
+            else:
+                entry.state = 'done'
+            entry.locked_at = None
+            db.session.commit()
+            return entry.state
+        finally:
+            db.session.remove()
+
+
+_process_app = None  # the app of a pool's child process, inherited from the parent by fork
+
+
+def _init_process(app):
+    global _process_app
+    _process_app = app
+    # Connections inherited from the parent must not be shared with it
+    with app.app_context():
+        db.engine.dispose()
+
+
+def _run_in_process(job_id):
+    return run_job(_process_app, job_id)
+
+
+def work(workers, processes=False, once=False):
+    # Keep up to `workers` jobs running until interrupted; with once, stop when nothing is due
+    app = current_app._get_current_object()
+    if processes:
+        # Forked children share the parent's app instead of each building their own
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'),
+                                   initializer=_init_process, initargs=(app,))
+        run = _run_in_process
+    else:
+        pool = ThreadPoolExecutor(workers, thread_name_prefix='job')
+        run = partial(run_job, app)
+    running = set()
+    last_sweep = 0
+    try:
+        while True:
+            with app.app_context():
+                try:
+                    if time.monotonic() - last_sweep > app.config['JOBS_LOCK_TIMEOUT'] / 2:
+                        requeue_stale()
+                        last_sweep = time.monotonic()
+                    claimed = claim(workers - len(running)) if len(running) < workers else []
+                finally:
+                    db.session.remove()
+            running.update(pool.submit(run, job_id) for job_id in claimed)
+            if not running:
+                if once:
+                    return
+                time.sleep(app.config['JOBS_POLL_INTERVAL'])
+                continue
+            done, running = wait(running, timeout=app.config['JOBS_POLL_INTERVAL'], return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    app.logger.error('Job runner crashed', exc_info=future.exception())
+    finally:
+        pool.shutdown(wait=True)
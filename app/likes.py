@@ -0,0 +1,129 @@
+from threading import Lock
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+
+from app import db, events
+from app.cache import TTLCache
+from app.catalog import ChangeLog
+from app.extensions import AppLocal
+from app.models import Like
+
+
+class LikeGraph():
+    # Each user's outgoing and incoming edges as sorted int32 arrays, loaded from one index range scan each.
+    # Mutual matches, counts and suggestions are array intersections instead of self-joins on the like table.
+    # Commits in this worker drop the arrays they change; other workers' commits reach it through the change log
+
+    def __init__(self):
+        self.cache = TTLCache(0, 0)
+        self.lock = Lock()
+        self.changes = None
+
+    def init_app(self, app):
+        self.cache.configure(app.config['LIKE_CACHE_SIZE'] * 2, app.config['LIKE_CACHE_TTL'])
+        self.changes = ChangeLog(app.config['LIKE_GRAPH_CHANGES'], app.config['LIKE_CACHE_CHECK_INTERVAL'],
+                                 app.config['LIKE_GRAPH_CHANGES_MAX_BYTES'])
+
+    def _sync(self):
+        with self.lock:
+            if not self.changes.due():
+                return
+            changed = self.changes.read()
+        if changed is None:
+            self.cache.clear()
+        elif changed:
+            self.cache.invalidate([(direction, user_id) for user_id in changed for direction in ('out', 'in')])
+
+    def _edges(self, direction, user_id):
+        self._sync()
+        edges = self.cache.get((direction, user_id))
+        if edges is None:
+            if direction == 'out':
+                rows = db.session.query(Like.liked_id).filter(Like.user_id == user_id)
+            else:
+                rows = db.session.query(Like.user_id).filter(Like.liked_id == user_id)
+            edges = np.sort(np.fromiter((row[0] for row in rows), dtype=np.int32))
+            self.cache.set((direction, user_id), edges)
+        return edges
+
+    def _preload(self, direction, user_ids):
+        # Fill every uncached array among user_ids from a single query instead of one query per user
+        self._sync()
+        missing = [user_id for user_id in user_ids if self.cache.get((direction, user_id)) is None]
+        if not missing:
+            return
+        if direction == 'out':
+            rows = db.session.query(Like.user_id, Like.liked_id).filter(Like.user_id.in_(missing))
+        else:
+            rows = db.session.query(Like.liked_id, Like.user_id).filter(Like.liked_id.in_(missing))
+        edges = {user_id: [] for user_id in missing}
+        for user_id, other_id in rows:
+            edges[user_id].append(other_id)
+        for user_id, others in edges.items():
+            self.cache.set((direction, user_id), np.sort(np.array(others, dtype=np.int32)))
+
+    def liked(self, user_id):
+        return self._edges('out', user_id)
+
+    def liked_by(self, user_id):
+        return self._edges('in', user_id)
+
+    def mutual(self, user_id):
+        return np.intersect1d(self.liked(user_id), self.liked_by(user_id), assume_unique=True)
+
+    def admirers(self, user_id):
+        # People who like this user and are still waiting for a like back
+        return np.setdiff1d(self.liked_by(user_id), self.liked(user_id), assume_unique=True)
+
+    def suggestions(self, user_id, limit, fanout):
+        # Mutual matches of my mutual matches, ranked by how many of my matches they share
+        friends = self.mutual(user_id)
+        if not len(friends):
+            return []
+        friends = friends[:fanout].tolist()
+        self._preload('out', friends)
+        self._preload('in', friends)
+        reach = [self.mutual(friend) for friend in friends]
+        candidates, counts = np.unique(np.concatenate(reach), return_counts=True)
+        keep = np.isin(candidates, self.liked(user_id), assume_unique=True, invert=True) & (candidates != user_id)
+        candidates, counts = candidates[keep], counts[keep]
+        order = np.lexsort((candidates, -counts))[:limit]
+        return [(int(candidates[i]), int(counts[i])) for i in order]
+
+    def invalidate_liked(self, user_ids):
+        self.cache.invalidate([('out', user_id) for user_id in user_ids])
+        self.changes.append(user_ids)
+
+    def invalidate_liked_by(self, user_ids):
+        self.cache.invalidate([('in', user_id) for user_id in user_ids])
+        self.changes.append(user_ids)
+
+
+def likes(user_id, other_id):
+    # Read from the row rather than the cached arrays: a button showing the wrong state would undo the click
+    return Like.query.get((user_id, other_id)) is not None
+
+
+# Both go through the session so the commit hooks below drop the cached arrays of both users
+def like(user_id, other_id):
+    if Like.query.get((user_id, other_id)) is not None:
+        return
+    try:
+        # A double submit may insert the same edge concurrently; the primary key keeps one
+        with db.session.begin_nested():
+            db.session.add(Like(user_id=user_id, liked_id=other_id))
+    except IntegrityError:
+        pass
+
+
+def unlike(user_id, other_id):
+    edge = Like.query.get((user_id, other_id))
+    if edge is not None:
+        db.session.delete(edge)
+
+
+like_graph = AppLocal('like_graph', LikeGraph)
+
+events.on_commit(Like, key=lambda like: like.user_id)(like_graph.hook('invalidate_liked'))
+events.on_commit(Like, key=lambda like: like.liked_id)(like_graph.hook('invalidate_liked_by'))
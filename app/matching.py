@@ -0,0 +1,342 @@
+import time
+from bisect import insort
+from datetime import datetime
+from queue import Queue, Empty
+from threading import Lock, RLock, Thread
+
+import numpy as np
+from flask import current_app
+
+from app import db, events
+from app.catalog import ChangeLog
+from app.extensions import AppLocal
+from app.metrics import Counter, Gauge
+from app.models import User
+from app.search import is_searchable
+
+# Each user's language roles are packed into User.language_roles with one 16 bit lane per role:
+# bit (role * ROLE_STRIDE + Language.position). Only 15 languages fit so the last lane stays clear of the sign bit
+ROLES = ('sp', 'st', 't', 'o')  # fluent speaker, student, teacher, other
+ROLE_STRIDE = 16
+MAX_LANGUAGES = ROLE_STRIDE - 1
+LANE = (1 << ROLE_STRIDE) - 1
+
+SPEAKER, STUDENT, TEACHER, OTHER = range(len(ROLES))
+
+index_lag = Gauge('langmatch_match_index_lag_seconds', 'Seconds between a commit and the match index reflecting it')
+index_pending = Gauge('langmatch_match_index_pending_batches', 'Commits waiting for the match index worker')
+index_refreshed = Counter('langmatch_match_index_refreshed_total', 'Candidate lists recomputed by the match index worker')
+
+EPOCH = datetime(1970, 1, 1)
+
+WORKER_IDLE = 60  # seconds the refresh thread waits for more work before exiting
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+# Per-language role bits, as stored in UserLanguage.roles
+def role_bits(codes):
+    return sum(1 << ROLES.index(code) for code in codes or ())
+
+
+def role_codes(bits):
+    return [role for r, role in enumerate(ROLES) if (bits or 0) >> r & 1]
+
+
+def encode_roles(selected):
+    # selected maps a Language.position to that language's role bits
+    mask = 0
+    for position, bits in selected.items():
+        for r in range(len(ROLES)):
+            if bits >> r & 1:
+                mask |= 1 << (r * ROLE_STRIDE + position)
+    return mask
+
+
+def timestamp(last_seen):
+    return (last_seen - EPOCH).total_seconds() if last_seen is not None else 0.0
+
+
+def _rank_key(entry):
+    # Candidate lists run in descending (score, last_seen, id) order
+    user_id, score, seen = entry
+    return -score, -seen, -user_id
+
+
+def popcount(lanes):
+    lanes = lanes.astype(np.uint16, copy=False)
+    return _POPCOUNT[lanes & 0xFF].astype(np.int16) + _POPCOUNT[lanes >> 8]
+
+
+class MatchIndex():
+    # Column-oriented snapshot of every user's roles, scored with whole-array numpy operations.
+    # Commits in this worker refresh it in the background. Other workers' commits reach it through the change log
+    # and are refreshed the same way; only a rotated log, or none read yet, costs a full rebuild
+
+    def __init__(self):
+        self.lock = RLock()
+        self.ids = None
+        self.rows = {}
+        self._top = {}
+        self._holders = {}
+        self.generation = 0  # bumped whenever the arrays are replaced or dropped
+        self.changes = None
+        # Dirty user ids are handed to a background thread so commits never wait on index maintenance. Each app's
+        # index has its own queue and thread, running in that app's context
+        self.dirty = Queue()
+        self.worker = None
+        self.worker_lock = Lock()
+
+    def init_app(self, app):
+        self.top_k = app.config['MATCH_TOP_K']
+        self.changes = ChangeLog(app.config['MATCH_INDEX_CHANGES'], app.config['USER_INDEX_CHECK_INTERVAL'],
+                                 app.config['MATCH_INDEX_CHANGES_MAX_BYTES'])
+        self.invalidate()
+
+    def _ensure(self):
+        if self.ids is None:
+            self.changes.start()
+            self.build()
+        elif self.changes.due():
+            changed = self.changes.read()
+            if changed is None:
+                self.build()
+            elif changed:
+                self._enqueue(changed)
+
+    def build(self):
+        rows = db.session.query(User.id, User.language_roles, User.privacy, User.last_seen).order_by(User.id).all()
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        roles = np.array([r[1] or 0 for r in rows], dtype=np.int64)
+        searchable = np.array([is_searchable(r[2]) for r in rows], dtype=bool)
+        seen = np.array([timestamp(r[3]) for r in rows], dtype=np.float64)
+        with self.lock:
+            self._load(ids, roles, searchable, seen)
+
+    def _load(self, ids, roles, searchable, seen):
+        self.ids = ids
+        self.seen = seen  # last_seen as of the row's last load, the secondary sort key
+        self.rows = {int(uid): row for row, uid in enumerate(ids)}
+        self.lanes = np.stack([(roles >> (r * ROLE_STRIDE)) & LANE for r in range(len(ROLES))]).astype(np.uint16)
+        self.searchable = searchable
+        # (score, last_seen, id) key of the last entry in each viewer's cached list; a candidate enters the list
+        # only when its key sorts above it. Viewers with a short list take any positive score, those without none
+        self.cutoff = np.zeros(len(ids), dtype=np.int16)
+        self.cutoff_seen = np.full(len(ids), np.inf)
+        self.cutoff_id = np.zeros(len(ids), dtype=np.int64)
+        self.cached = np.zeros(len(ids), dtype=bool)
+        self._top = {}
+        self._holders = {}  # candidate id -> viewers whose cached list contains it
+        self.generation += 1
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.ids = None
+            self.rows = {}
+            self._top = {}
+            self._holders = {}
+
+    def refresh(self, user_ids):
+        # Reload the given users' rows and update only the candidate lists they can change. A list the user just
+        # enters takes them by insertion; a list they were already in is ranked again, outside the lock and on
+        # the arrays as they were, so browsing never waits for a large refresh
+        rows = db.session.query(User.id, User.language_roles, User.privacy, User.last_seen).\
+            filter(User.id.in_(user_ids)).all()
+        with self.lock:
+            if self.ids is None:
+                return 0
+            self._upsert_rows(user_ids, rows)
+            rerank = set()
+            entering = {}  # viewer row -> [(user id, score, last_seen)]
+            for uid in user_ids:
+                row = self.rows.get(uid)
+                if row is None:
+                    continue
+                rerank.add(row)
+                rerank.update(self.rows[v] for v in self._holders.get(uid, ()))
+                # Scores are symmetric, so this is also the changed user's score in everyone else's view
+                score = self.scores(row) if self.searchable[row] else np.zeros_like(self.cutoff)
+                for viewer in np.flatnonzero(self._enters(row, score)).tolist():
+                    entering.setdefault(viewer, []).append((uid, int(score[viewer]), float(self.seen[row])))
+            inserted = 0
+            for row, candidates in entering.items():
+                if row not in rerank:
+                    self._insert(int(self.ids[row]), row, candidates)
+                    inserted += 1
+            rerank = [(int(self.ids[row]), row) for row in rerank if int(self.ids[row]) in self._top]
+            generation = self.generation
+            columns = self._columns()
+        ranked = [(viewer, row, self._select(row, self.top_k, columns=columns)) for viewer, row in rerank]
+        with self.lock:
+            if self.generation != generation:
+                return 0
+            for viewer, row, entries in ranked:
+                if viewer in self._top:
+                    self._install(viewer, row, entries)
+        return inserted + len(ranked)
+
+    def _enters(self, row, score):
+        # Viewers with a cached list that the candidate's (score, last_seen, id) key would enter
+        seen, uid = self.seen[row], self.ids[row]
+        wins_tie = (seen > self.cutoff_seen) | ((seen == self.cutoff_seen) & (uid > self.cutoff_id))
+        above = (score > self.cutoff) | ((score == self.cutoff) & wins_tie)
+        return self.cached & (score > 0) & above
+
+    def _upsert_rows(self, user_ids, rows):
+        found = {uid: (roles or 0, is_searchable(privacy), timestamp(last_seen)) for uid, roles, privacy, last_seen in rows}
+        added = [uid for uid in user_ids if uid not in self.rows and uid in found]
+        if added:
+            start = len(self.ids)
+            self.ids = np.concatenate([self.ids, np.array(added, dtype=np.int64)])
+            self.lanes = np.concatenate([self.lanes, np.zeros((len(ROLES), len(added)), dtype=np.uint16)], axis=1)
+            self.searchable = np.concatenate([self.searchable, np.zeros(len(added), dtype=bool)])
+            self.seen = np.concatenate([self.seen, np.zeros(len(added), dtype=np.float64)])
+            self.cutoff = np.concatenate([self.cutoff, np.zeros(len(added), dtype=np.int16)])
+            self.cutoff_seen = np.concatenate([self.cutoff_seen, np.full(len(added), np.inf)])
+            self.cutoff_id = np.concatenate([self.cutoff_id, np.zeros(len(added), dtype=np.int64)])
+            self.cached = np.concatenate([self.cached, np.zeros(len(added), dtype=bool)])
+            self.rows.update((uid, start + i) for i, uid in enumerate(added))
+        for uid in user_ids:
+            if uid not in self.rows:
+                continue
+            # Deleted users keep their row but drop out of every result
+            roles, searchable, seen = found.get(uid, (0, False, 0.0))
+            row = self.rows[uid]
+            for r in range(len(ROLES)):
+                self.lanes[r, row] = (roles >> (r * ROLE_STRIDE)) & LANE
+            self.searchable[row] = searchable
+            self.seen[row] = seen
+
+    def _columns(self):
+        # The arrays a ranking reads. The refresh worker is the only writer that updates them in place
+        return self.ids, self.lanes, self.seen, self.searchable
+
+    def scores(self, row, columns=None):
+        # Languages they can help me with plus languages I can help them with, for every user at once
+        _, lanes, _, searchable = columns or self._columns()
+        offers = lanes[SPEAKER] | lanes[TEACHER]
+        wants = lanes[STUDENT]
+        score = popcount(offers & wants[row]) + popcount(wants & offers[row])
+        score[row] = 0
+        score[~searchable] = 0
+        return score
+
+    def _select(self, row, limit, after=None, columns=None):
+        # The next `limit` candidates in descending (score, last_seen, id) order, strictly after the cursor key.
+        # Cost depends on the population size only, never on how deep the cursor is
+        columns = columns or self._columns()
+        ids, _, seen, _ = columns
+        score = self.scores(row, columns)
+        mask = score > 0
+        if after is not None:
+            after_score, after_seen, after_id = after
+            mask &= (score < after_score) | ((score == after_score) &
+                                             ((seen < after_seen) | ((seen == after_seen) & (ids < after_id))))
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > limit:
+            # Keep the best `limit` scores (and their ties) before the exact three-key sort
+            kth = len(candidates) - limit
+            threshold = np.partition(score[candidates], kth)[kth]
+            candidates = candidates[score[candidates] >= threshold]
+        order = np.lexsort((-ids[candidates], -seen[candidates], -score[candidates]))
+        candidates = candidates[order[:limit]]
+        return [(int(ids[c]), int(score[c]), float(seen[c])) for c in candidates]
+
+    def _insert(self, user_id, row, candidates):
+        ranked = self._top[user_id]
+        for candidate in candidates:
+            insort(ranked, candidate, key=_rank_key)
+            self._holders.setdefault(candidate[0], set()).add(user_id)
+        for candidate, _, _ in ranked[self.top_k:]:
+            self._holders[candidate].discard(user_id)
+        del ranked[self.top_k:]
+        self._set_cutoff(row, ranked)
+
+    def _cache(self, user_id, row):
+        return self._install(user_id, row, self._select(row, self.top_k))
+
+    def _install(self, user_id, row, ranked):
+        for candidate, _, _ in self._top.get(user_id, ()):
+            self._holders[candidate].discard(user_id)
+        for candidate, _, _ in ranked:
+            self._holders.setdefault(candidate, set()).add(user_id)
+        self._top[user_id] = ranked
+        self._set_cutoff(row, ranked)
+        return ranked
+
+    def _set_cutoff(self, row, ranked):
+        self.cached[row] = True
+        if len(ranked) == self.top_k:
+            self.cutoff[row], self.cutoff_seen[row], self.cutoff_id[row] = ranked[-1][1], ranked[-1][2], ranked[-1][0]
+        else:
+            self.cutoff[row], self.cutoff_seen[row], self.cutoff_id[row] = 0, np.inf, 0
+
+    def top_matches(self, user_id, k=None):
+        k = k or self.top_k
+        with self.lock:
+            self._ensure()
+            if user_id not in self._top:
+                row = self.rows.get(user_id)
+                if row is None:
+                    return []
+                self._cache(user_id, row)
+            return self._top[user_id][:k]
+
+    def feed(self, user_id, limit, after=None):
+        # (user id, score, last_seen) entries; the first page comes from the maintained top-K list
+        if after is None and limit <= self.top_k:
+            return self.top_matches(user_id, limit)
+        with self.lock:
+            self._ensure()
+            row = self.rows.get(user_id)
+            return [] if row is None else self._select(row, limit, after)
+
+
+    def mark_dirty(self, user_ids):
+        self.changes.append(user_ids)
+        self._enqueue(user_ids)
+
+    def _enqueue(self, user_ids):
+        self.dirty.put((time.time(), set(user_ids)))
+        index_pending.set(self.dirty.qsize())
+        with self.worker_lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = Thread(target=self._run_worker, args=(current_app._get_current_object(),),
+                                     name='match-index', daemon=True)
+                self.worker.start()
+
+    def _run_worker(self, app):
+        while True:
+            try:
+                oldest, user_ids = self.dirty.get(timeout=WORKER_IDLE)
+            except Empty:
+                # Let an idle thread go rather than keep its app alive; the next commit starts another
+                with self.worker_lock:
+                    if self.dirty.empty():
+                        self.worker = None
+                        return
+                continue
+            # Coalesce everything queued behind the first batch into a single refresh
+            try:
+                while True:
+                    _, more = self.dirty.get_nowait()
+                    user_ids |= more
+            except Empty:
+                pass
+            index_pending.set(self.dirty.qsize())
+            with app.app_context():
+                try:
+                    index_refreshed.inc(self.refresh(user_ids))
+                except Exception:
+                    app.logger.exception('Match index refresh failed, rebuilding on next use')
+                    self.invalidate()
+                finally:
+                    db.session.remove()
+            index_lag.set(time.time() - oldest)
+
+
+match_index = AppLocal('match_index', MatchIndex)
+
+# Scores only read roles and privacy; last_seen, the tie-breaker, is picked up whenever a row is reloaded
+events.on_commit(User, columns=('language_roles', 'privacy'))(match_index.hook('mark_dirty'))
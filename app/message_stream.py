@@ -0,0 +1,176 @@
+import asyncio
+import json
+import time
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+
+from flask import current_app
+
+from app import db
+from app.messaging import deliveries, latest_message_id, stream_user
+
+# Server-sent events for new messages, run as its own process by `flask messages stream`.
+# Every open connection is a coroutine parked on its own queue, so idle browsers cost no thread and no query:
+# one poll query per interval fetches all new messages and fans them out to whoever is connected
+POLL_BATCH = 500
+QUEUE_SIZE = 100  # events buffered per connection before a slow client is dropped; it resumes via Last-Event-ID
+CATCH_UP_LIMIT = 200
+
+
+def _query(app, fn, *args):
+    with app.app_context():
+        try:
+            return fn(*args)
+        finally:
+            db.session.remove()
+
+
+class MessageStream():
+    def __init__(self, app, poll_interval, heartbeat, overlap):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        # Ids are handed out before commit, so on a server database a message can become visible after one with
+        # a higher id was delivered. Each poll reads again from the newest id seen at least `overlap` seconds ago
+        self.overlap = overlap
+        self.clients = {}  # user id -> set of queues, one per open connection
+        self.last_id = 0
+        self.after = 0  # every message up to this id was delivered or will never appear
+        self.marks = deque()  # (monotonic time, last_id) after each poll, for advancing `after`
+        self.delivered = set()  # ids above `after` already fanned out
+
+    async def _db(self, fn, *args):
+        # SQLAlchemy blocks, so queries run on the default executor rather than the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, _query, self.app, fn, *args)
+
+    async def serve(self, host, port):
+        self.last_id = self.after = await self._db(latest_message_id)
+        server = await asyncio.start_server(self._handle, host, port)
+        poller = asyncio.create_task(self._poll())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            poller.cancel()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll_once()
+            except Exception:
+                self.app.logger.exception('Message stream poll failed')
+
+    async def poll_once(self):
+        after = self.after
+        while True:
+            rows = await self._db(deliveries, after, POLL_BATCH)
+            for event, user_id in rows:
+                if event['id'] not in self.delivered:
+                    for queue in list(self.clients.get(user_id, ())):
+                        self._offer(queue, event)
+            ids = {event['id'] for event, _ in rows}
+            self.delivered |= ids
+            if ids:
+                after = max(ids)
+                self.last_id = max(self.last_id, after)
+            if len(ids) < POLL_BATCH:
+                break
+        now = time.monotonic()
+        self.marks.append((now, self.last_id))
+        while len(self.marks) > 1 and self.marks[1][0] <= now - self.overlap:
+            self.marks.popleft()
+        if self.marks[0][0] <= now - self.overlap:
+            self.after = self.marks[0][1]
+        self.delivered = {message_id for message_id in self.delivered if message_id > self.after}
+
+    def _offer(self, queue, event):
+        if queue.full():
+            # The connection's coroutine sees the flag on its next get and hangs up
+            queue.overflowed = True
+            return
+        queue.put_nowait(event)
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(self._read_request(reader), timeout=10)
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            writer.close()
+            return
+        path, query, headers = request
+        user_id = None
+        if path == '/stream':
+            with self.app.app_context():
+                user_id = stream_user(query.get('token', [''])[0])
+        if user_id is None:
+            writer.write(b'HTTP/1.1 ' + (b'403 Forbidden' if path == '/stream' else b'404 Not Found') +
+                         b'\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            await self._close(writer)
+            return
+
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                     b'Connection: keep-alive\r\nAccess-Control-Allow-Origin: *\r\nX-Accel-Buffering: no\r\n\r\n'
+                     b'retry: 5000\n\n')
+        queue = asyncio.Queue(QUEUE_SIZE)
+        queue.overflowed = False
+        self.clients.setdefault(user_id, set()).add(queue)
+        replayed = set()
+        try:
+            # Reconnecting browsers send the id of the last event they saw; replay what they missed
+            resume = headers.get('last-event-id') or query.get('after', [''])[0]
+            if resume.isdigit() and int(resume) < self.last_id:
+                for event, _ in await self._db(deliveries, int(resume), CATCH_UP_LIMIT, user_id):
+                    writer.write(self._format(event))
+                    replayed.add(event['id'])
+            await writer.drain()
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    writer.write(b': keepalive\n\n')
+                else:
+                    if queue.overflowed:
+                        break
+                    if event['id'] in replayed:
+                        continue
+                    writer.write(self._format(event))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients[user_id].discard(queue)
+            if not self.clients[user_id]:
+                del self.clients[user_id]
+            await self._close(writer)
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3 or request_line[0] != 'GET':
+            raise ValueError('Bad request line')
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(request_line[1])
+        return url.path.rstrip('/'), parse_qs(url.query), headers
+
+    def _format(self, event):
+        return 'id: {}\nevent: message\ndata: {}\n\n'.format(event['id'], json.dumps(event)).encode()
+
+    async def _close(self, writer):
+        try:
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+def run(host, port):
+    app = current_app._get_current_object()
+    stream = MessageStream(app, app.config['MESSAGE_POLL_INTERVAL'], app.config['MESSAGE_HEARTBEAT'],
+                           app.config['MESSAGE_POLL_OVERLAP'])
+    asyncio.run(stream.serve(host, port))
@@ -0,0 +1,121 @@
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import User, Conversation, ConversationMember, Message
+
+
+def find_conversation(user_id, other_id):
+    low, high = sorted((user_id, other_id))
+    return Conversation.query.filter_by(user_low_id=low, user_high_id=high).first()
+
+
+def start_conversation(user_id, other_id):
+    conversation = find_conversation(user_id, other_id)
+    if conversation is not None:
+        return conversation
+    low, high = sorted((user_id, other_id))
+    try:
+        # Both users may send their first message at once; the pair constraint lets only one insert win
+        with db.session.begin_nested():
+            conversation = Conversation(user_low_id=low, user_high_id=high)
+            db.session.add(conversation)
+            db.session.flush()
+            db.session.add_all([ConversationMember(conversation_id=conversation.id, user_id=uid, last_read_id=0)
+                                for uid in (low, high)])
+    except IntegrityError:
+        conversation = find_conversation(user_id, other_id)
+    return conversation
+
+
+# Add a message inside the caller's transaction; the sender has read everything up to it
+def send(conversation, sender_id, body):
+    message = Message(conversation_id=conversation.id, sender_id=sender_id, body=body)
+    db.session.add(message)
+    db.session.flush()
+    conversation.last_message_id = message.id
+    mark_read(conversation.id, sender_id, message.id)
+    return message
+
+
+def mark_read(conversation_id, user_id, message_id):
+    ConversationMember.query.\
+        filter(ConversationMember.conversation_id == conversation_id, ConversationMember.user_id == user_id,
+               ConversationMember.last_read_id < message_id).\
+        update({'last_read_id': message_id}, synchronize_session=False)
+
+
+# Page of messages before the given id, oldest first, plus the id to continue from or None on the last page
+def history(conversation_id, limit, before=None):
+    query = Message.query.filter(Message.conversation_id == conversation_id)
+    if before is not None:
+        query = query.filter(Message.id < before)
+    messages = query.order_by(Message.id.desc()).limit(limit).all()
+    older = messages[-1].id if len(messages) == limit else None
+    return messages[::-1], older
+
+
+# Unread message counts for every conversation of the user in one grouped query, keyed by conversation id
+def unread_counts(user_id):
+    rows = db.session.query(ConversationMember.conversation_id, db.func.count(Message.id)).\
+        join(Message, db.and_(Message.conversation_id == ConversationMember.conversation_id,
+                              Message.id > ConversationMember.last_read_id, Message.sender_id != user_id)).\
+        filter(ConversationMember.user_id == user_id).\
+        group_by(ConversationMember.conversation_id)
+    return dict(rows)
+
+
+# (conversation, other user, last message, unread count) for the user's most recently active conversations
+def conversations(user_id, limit):
+    rows = db.session.query(Conversation, User).\
+        join(ConversationMember, ConversationMember.conversation_id == Conversation.id).\
+        join(User, db.and_(db.or_(User.id == Conversation.user_low_id, User.id == Conversation.user_high_id),
+                           User.id != user_id)).\
+        filter(ConversationMember.user_id == user_id, Conversation.last_message_id.isnot(None)).\
+        order_by(Conversation.last_message_id.desc()).limit(limit).all()
+    last_ids = [conversation.last_message_id for conversation, _ in rows]
+    last = {m.id: m for m in Message.query.filter(Message.id.in_(last_ids))} if last_ids else {}
+    unread = unread_counts(user_id)
+    return [(conversation, user, last.get(conversation.last_message_id), unread.get(conversation.id, 0))
+            for conversation, user in rows]
+
+
+def latest_message_id():
+    return db.session.query(db.func.max(Message.id)).scalar() or 0
+
+
+# The next `limit` messages after the given id, each paired with every member it must be delivered to, for the
+# stream's single poll query. recipient narrows it to one user's conversations when a client catches up
+def deliveries(after, limit, recipient=None):
+    ids = db.session.query(Message.id).filter(Message.id > after)
+    if recipient is not None:
+        ids = ids.filter(Message.conversation_id.in_(
+            db.session.query(ConversationMember.conversation_id).filter(ConversationMember.user_id == recipient)))
+    ids = ids.order_by(Message.id).limit(limit).subquery()
+    query = db.session.query(Message, User.username, ConversationMember.user_id).\
+        join(ids, ids.c.id == Message.id).\
+        join(ConversationMember, ConversationMember.conversation_id == Message.conversation_id).\
+        join(User, User.id == Message.sender_id)
+    if recipient is not None:
+        query = query.filter(ConversationMember.user_id == recipient)
+    return [(payload(message, username), member_id)
+            for message, username, member_id in query.order_by(Message.id)]
+
+
+def payload(message, username):
+    return {'id': message.id, 'conversation': message.conversation_id, 'sender': username,
+            'body': message.body, 'timestamp': message.timestamp.isoformat()}
+
+
+# Short-lived tokens let the stream process, which has no Flask session, authenticate browsers
+def stream_token(user_id):
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='message-stream').dumps(user_id)
+
+
+def stream_user(token):
+    try:
+        return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='message-stream').\
+            loads(token, max_age=current_app.config['MESSAGE_STREAM_TOKEN_MAX_AGE'])
+    except BadSignature:
+        return None
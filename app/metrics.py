@@ -0,0 +1,90 @@
+from bisect import bisect_left
+from threading import Lock
+
+# Minimal in-process metrics registry rendered in the Prometheus text exposition format by /metrics
+_registry = []
+
+
+class Metric():
+    type = None
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.lock = Lock()
+        self.values = {}
+        _registry.append(self)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, labels, value) for labels, value in sorted(self.values.items())]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+    def get(self, **labels):
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def remove(self, **labels):
+        with self.lock:
+            self.values.pop(tuple(sorted(labels.items())), None)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+    DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, help)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self.values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                samples.append((self.name + '_bucket', labels + (('le', le),), cumulative))
+            samples.append((self.name + '_sum', labels, total))
+            samples.append((self.name + '_count', labels, cumulative))
+        return samples
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels) + '}'
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.append('# HELP {} {}'.format(metric.name, metric.help))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+        for name, labels, value in metric.samples():
+            lines.append('{}{} {}'.format(name, _format_labels(labels), value))
+    return '\n'.join(lines) + '\n'
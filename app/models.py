@@ -1,16 +1,17 @@
+from flask import current_app, url_for
 from flask_login import UserMixin
-from app import db, login
+from app import db, login, events
+from app.cache import TTLCache
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-from PIL import Image
-import requests
-from io import BytesIO
+from app.passwords import hash_password, verify_password, needs_rehash
 
 
 class User(UserMixin, db.Model):
+    __table_args__ = (db.Index('ix_user_last_seen_id', 'last_seen', 'id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(40), index=True, unique=True)
-    password_hash = db.Column(db.String(40))
+    password_hash = db.Column(db.String(128))
     email = db.Column(db.String(80), index=True, unique=True)
 
     gender = db.Column(db.String(6))
@@ -18,32 +19,72 @@ class User(UserMixin, db.Model):
     city = db.Column(db.String(50))
     state = db.Column(db.String(50))
     zip_code = db.Column(db.String(5))
+    latitude = db.Column(db.Float)  # centroid of zip_code, filled in when settings are saved
+    longitude = db.Column(db.Float)
 
     privacy = db.Column(db.String(50))  # 1. None, 2. Only registered users, 3. Hide all details from profile (except username), 4. Hide all details from profile and searching! (Warning: extreme. You won't be found by anyone else except those who know your username)
     last_seen = db.Column(db.DateTime)
+    language_roles = db.Column(db.BigInteger, default=0)  # packed speaker/student/teacher/other bitmask, see app/matching.py
+    avatar_hash = db.Column(db.String(40))  # sha1 of the uploaded source image, None for the default avatar
     answers = db.relationship('Answer', backref='author', lazy='dynamic')
     preferences = db.relationship('Preference', backref='author', lazy='dynamic')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    # True when the stored hash was made with an older algorithm or cost than Config asks for
+    def password_outdated(self):
+        return needs_rehash(self.password_hash)
 
+    # Thumbnails are rendered and cached by the avatar route, so this only builds a URL
     def avatar(self, size):
-        r = requests.get("http://www.blankinshippt.com/images/icons/blank-person.jpg")
-        img = Image.open(BytesIO(r.content))
-        new_width, new_height = size, size
-        img.resize((new_width, new_height), Image.ANTIALIAS)
-        return img
+        return url_for('profile.avatar', digest=self.avatar_hash or 'default', size=size)
 
     def __repr__(self):
         return '<User {}>'.format(self.username)
 
+# Detached copies of recently seen users, so authenticated requests can skip the primary key lookup.
+# Snapshots are shared between requests: views that change the current user must attach() it first
+def init_app(app):
+    app.extensions['user_snapshots'] = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+
 # Load a user from the database given an id
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    id = int(id)
+    snapshots = current_app.extensions['user_snapshots']
+    user = snapshots.get(id)
+    if user is None:
+        user = User.query.get(id)
+        if user is not None:
+            db.session.expunge(user)
+            snapshots.set(id, user)
+    return user
+
+
+# Keyset page of recently active, searchable users: newest last_seen first, id breaking ties.
+# after is the (last_seen, id) of the previous page's final row
+def recently_active(exclude_id, limit, after=None):
+    query = User.query.filter(User.last_seen.isnot(None), User.id != exclude_id,
+                              db.or_(User.privacy.is_(None), User.privacy != '4'))
+    if after is not None:
+        last_seen, id = after
+        query = query.filter(db.or_(User.last_seen < last_seen, db.and_(User.last_seen == last_seen, User.id < id)))
+    return query.order_by(User.last_seen.desc(), User.id.desc()).limit(limit).all()
+
+
+# Return a session-bound copy of a cached user without issuing a SELECT
+def attach(user):
+    return db.session.merge(user, load=False)
+
+
+@events.on_commit(User)
+def _drop_snapshots(user_ids):
+    current_app.extensions['user_snapshots'].invalidate(user_ids)
 
 
 class Question(db.Model):
@@ -58,9 +99,11 @@ class Question(db.Model):
 
 
 class Answer(db.Model):
+    __table_args__ = (db.Index('ix_answer_user_id_timestamp', 'user_id', 'timestamp'),)
+
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.String(500))
-    timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow, onupdate=datetime.utcnow)  # last edit
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     question_id = db.Column(db.Integer, db.ForeignKey('question.id'))
     preferences = db.relationship('Preference', backref='answer', lazy='dynamic')
@@ -68,9 +111,159 @@ class Answer(db.Model):
     def __repr__(self):
         return '<Answer {}>'.format(self.body)
 
+
+# Everything a rendered profile reads from the database, as one row, or None for an unknown username.
+# Edits move an answer's timestamp, so the answer count and newest timestamp change whenever any answer does
+def profile_version(username):
+    return db.session.query(User.id, User.username, User.avatar_hash, User.privacy, db.func.count(Answer.id),
+                            db.func.max(Answer.timestamp)).\
+        outerjoin(Answer, Answer.user_id == User.id).filter(User.username == username).group_by(User.id).first()
+
+
+# Load the user's answers to the given questions in one query, keyed by question id
+def load_user_answers(user, questions):
+    if not questions:
+        return {}
+    answers = Answer.query.filter(Answer.user_id == user.id, Answer.question_id.in_([q.id for q in questions]))
+    return {answer.question_id: answer for answer in answers}
+
+class Language(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(20), unique=True)  # also the preferences form field name
+    name = db.Column(db.String(40))
+    position = db.Column(db.Integer, unique=True)  # bit within each role lane of User.language_roles
+
+    def __repr__(self):
+        return '<Language {}>'.format(self.code)
+
+
+# One row per user and language: the roles picked (bits in app.matching.ROLES order) and the explanation
+class UserLanguage(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    language_id = db.Column(db.Integer, db.ForeignKey('language.id'), primary_key=True)
+    roles = db.Column(db.SmallInteger, nullable=False, default=0)
+    body = db.Column(db.String(200))
+
+
+_upsert_user_language = db.text(
+    'INSERT INTO user_language (user_id, language_id, roles, body) VALUES (:user_id, :language_id, :roles, :body) '
+    'ON CONFLICT (user_id, language_id) DO UPDATE SET roles = excluded.roles, body = excluded.body')
+
+
+# Write all of a user's language rows in one statement, inside the caller's transaction
+def save_user_languages(user_id, rows):
+    rows = [dict(row, user_id=user_id) for row in rows]
+    if not rows:
+        return
+    if db.engine.dialect.name in ('sqlite', 'postgresql'):
+        db.session.execute(_upsert_user_language, rows)
+    else:
+        table = UserLanguage.__table__
+        db.session.execute(table.delete().where(table.c.user_id == user_id))
+        db.session.execute(table.insert(), rows)
+
+
 # For questions that have a type of short or basic, users can specify what they are looking for from other users' answers
 class Preference(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     question_id = db.Column(db.Integer, db.ForeignKey('question.id'))
     answer_id = db.Column(db.Integer, db.ForeignKey('answer.id'))
+
+
+# One conversation per pair of users, stored with the smaller user id first
+class Conversation(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_low_id', 'user_high_id', name='uq_conversation_pair'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_low_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_high_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    last_message_id = db.Column(db.Integer)  # newest message, for ordering the conversation list
+
+    def __repr__(self):
+        return '<Conversation {} {}>'.format(self.user_low_id, self.user_high_id)
+
+
+# Membership and read state: messages after last_read_id are unread for user_id
+class ConversationMember(db.Model):
+    __table_args__ = (db.Index('ix_conversation_member_user_id', 'user_id', 'conversation_id'),)
+
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    last_read_id = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Message(db.Model):
+    # Keeps each conversation's messages together in id order, so history pages and unread counts are range scans
+    __table_args__ = (db.Index('ix_message_conversation_id_id', 'conversation_id', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    body = db.Column(db.String(1000))
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Message {}>'.format(self.body)
+
+
+class Thread(db.Model):
+    # reply_count and last_activity are kept up to date by app.forum.reply in the posting transaction,
+    # so thread lists never count posts. The index serves each language's list in activity order
+    __table_args__ = (db.Index('ix_thread_language_id_last_activity', 'language_id', 'last_activity', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    language_id = db.Column(db.Integer, db.ForeignKey('language.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    title = db.Column(db.String(140))
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    reply_count = db.Column(db.Integer, nullable=False, default=0)
+    last_activity = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Thread {}>'.format(self.title)
+
+
+class Post(db.Model):
+    __table_args__ = (db.Index('ix_post_thread_id_id', 'thread_id', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    thread_id = db.Column(db.Integer, db.ForeignKey('thread.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    body = db.Column(db.String(2000))
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Post {}>'.format(self.body)
+
+
+# Directed interest edges. The primary key serves "whom do I like", the second index "who likes me"
+class Like(db.Model):
+    __table_args__ = (db.Index('ix_like_liked_id_user_id', 'liked_id', 'user_id'),)
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    liked_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Like {} {}>'.format(self.user_id, self.liked_id)
+
+
+# Durable background work, see app/jobs.py. Workers claim queued rows whose run_at has passed
+class Job(db.Model):
+    __table_args__ = (db.Index('ix_job_state_run_at', 'state', 'run_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)
+    payload = db.Column(db.Text)  # JSON keyword arguments
+    state = db.Column(db.String(10), nullable=False, default='queued')  # queued, running, done or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Job {} {}>'.format(self.name, self.state)
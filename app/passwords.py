@@ -0,0 +1,71 @@
+import hashlib
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+from time import perf_counter
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+from app.metrics import Histogram
+
+HASH_BUCKETS = (.01, .025, .05, .1, .2, .4, .8, 1.6, 3.2)
+
+hash_seconds = Histogram('langmatch_password_hash_seconds', 'Time spent hashing or verifying passwords, including queueing',
+                         HASH_BUCKETS)
+login_seconds = Histogram('langmatch_login_seconds', 'Total latency of /login form submissions', HASH_BUCKETS)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+# Hashing runs on a fixed pool per app; callers beyond the pool plus its queue allowance give up instead of piling up
+def init_app(app):
+    stored_method(app.config['PASSWORD_HASH_METHOD'])  # refuse a method needs_rehash cannot recognise
+    pool = ThreadPoolExecutor(max_workers=app.config['PASSWORD_HASH_WORKERS'], thread_name_prefix='password')
+    slots = BoundedSemaphore(app.config['PASSWORD_HASH_WORKERS'] + app.config['PASSWORD_HASH_QUEUE'])
+    app.extensions['passwords'] = (pool, slots)
+    weakref.finalize(app, pool.shutdown, wait=False)
+
+
+def _run(operation, fn, *args, **kwargs):
+    start = perf_counter()
+    pool, slots = current_app.extensions['passwords']
+    if not slots.acquire(timeout=current_app.config['PASSWORD_HASH_TIMEOUT']):
+        raise PasswordHasherBusy()
+    try:
+        return pool.submit(fn, *args, **kwargs).result()
+    finally:
+        slots.release()
+        hash_seconds.observe(perf_counter() - start, operation=operation)
+
+
+def hash_password(password):
+    return _run('hash', generate_password_hash, password, method=current_app.config['PASSWORD_HASH_METHOD'],
+                salt_length=current_app.config['PASSWORD_SALT_LENGTH'])
+
+
+def verify_password(pwhash, password):
+    return _run('verify', check_password_hash, pwhash, password)
+
+
+def stored_method(method):
+    # The method prefix werkzeug writes into hashes made with method: pbkdf2 always records its iteration count,
+    # a salted digest just its hashlib name. Any other method, plain text included, is refused
+    name, _, params = method.partition(':')
+    if name == 'pbkdf2':
+        digest, _, iterations = params.partition(':')
+        if digest in hashlib.algorithms_available and (iterations == '' or iterations.isdigit()):
+            return 'pbkdf2:{}:{}'.format(digest, int(iterations or 0) or DEFAULT_PBKDF2_ITERATIONS)
+    elif not params and name in hashlib.algorithms_available:
+        return name
+    raise ValueError('Unsupported PASSWORD_HASH_METHOD {!r}'.format(method))
+
+
+def needs_rehash(pwhash):
+    # Werkzeug hashes look like method$salt$hash, so outdated cost settings are visible without hashing
+    method, _, rest = (pwhash or '').partition('$')
+    salt = rest.partition('$')[0]
+    config = current_app.config
+    return method != stored_method(config['PASSWORD_HASH_METHOD']) or len(salt) != config['PASSWORD_SALT_LENGTH']
@@ -0,0 +1,126 @@
+import atexit
+import time
+import weakref
+from datetime import datetime, timedelta
+from threading import Lock, Thread
+
+from flask import current_app
+from sqlalchemy import bindparam
+
+from app import db
+from app.extensions import AppLocal
+from app.models import User
+
+_user = User.__table__
+_update_last_seen = _user.update().where(_user.c.id == bindparam('uid')).values(last_seen=bindparam('seen'))
+
+_apps = weakref.WeakSet()  # apps whose buffered values are written back when the process exits
+
+
+class PresenceTracker():
+    # Keeps last-seen times in memory and writes them back to the user table in batches
+
+    def __init__(self):
+        self.lock = Lock()
+        self.seen = {}  # user id -> latest request time seen by this process
+        self.stored = {}  # user id -> last_seen value known to be in the database
+        self.pending = {}  # user id -> value waiting for the next flush
+        self.last_flush = time.monotonic()
+        self.flusher = None
+
+    def init_app(self, app):
+        self.flush_interval = app.config['PRESENCE_FLUSH_INTERVAL']
+        self.flush_threshold = app.config['PRESENCE_FLUSH_THRESHOLD']
+        self.throttle = timedelta(seconds=app.config['PRESENCE_THROTTLE'])
+        self.online_window = timedelta(seconds=app.config['PRESENCE_ONLINE_WINDOW'])
+        _apps.add(app)
+
+    def touch(self, user_id, stored_last_seen=None):
+        now = datetime.utcnow()
+        with self.lock:
+            self.seen[user_id] = now
+            stored = self.stored.get(user_id, stored_last_seen)
+            # Rows already within the throttle window are left alone
+            if stored is None or now - stored >= self.throttle:
+                self.pending[user_id] = now
+                self._start_flusher()
+            due = len(self.pending) >= self.flush_threshold or \
+                (self.pending and time.monotonic() - self.last_flush >= self.flush_interval)
+        if due:
+            try:
+                self.flush()
+            except Exception:
+                # The batch is queued again for the next flush; the request that happened to trigger it goes on
+                current_app.logger.exception('Presence flush failed')
+
+    def _start_flusher(self):
+        # Called with the lock held. A worker that stops getting requests still writes its buffer back within
+        # the flush interval; the thread exits once nothing is pending and the next buffered value starts another
+        if self.flusher is None:
+            self.flusher = Thread(target=self._run_flusher, args=(current_app._get_current_object(),),
+                                  daemon=True, name='presence-flush')
+            self.flusher.start()
+
+    def _run_flusher(self, app):
+        while True:
+            time.sleep(self.flush_interval)
+            with self.lock:
+                if not self.pending:
+                    self.flusher = None
+                    return
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    app.logger.exception('Presence flush failed')
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        if not batch:
+            return 0
+        try:
+            # One executemany UPDATE on its own connection, outside the request's session
+            with db.engine.begin() as conn:
+                conn.execute(_update_last_seen, [{'uid': uid, 'seen': seen} for uid, seen in batch.items()])
+        except Exception:
+            with self.lock:
+                for uid, seen in batch.items():
+                    self.pending.setdefault(uid, seen)
+            raise
+        with self.lock:
+            self.stored.update(batch)
+            self._prune(datetime.utcnow())
+        return len(batch)
+
+    def _prune(self, now):
+        horizon = now - max(self.throttle, self.online_window)
+        for mapping in (self.seen, self.stored):
+            for uid in [uid for uid, seen in mapping.items() if seen < horizon]:
+                del mapping[uid]
+
+    def last_seen(self, user_id):
+        return self.seen.get(user_id)
+
+    def is_online(self, user_id, now=None):
+        seen = self.seen.get(user_id)
+        return seen is not None and (now or datetime.utcnow()) - seen < self.online_window
+
+    def online_now(self):
+        cutoff = datetime.utcnow() - self.online_window
+        with self.lock:
+            return [uid for uid, seen in self.seen.items() if seen >= cutoff]
+
+
+presence = AppLocal('presence', PresenceTracker)
+
+
+@atexit.register
+def _flush_on_exit():
+    for app in list(_apps):
+        with app.app_context():
+            try:
+                presence.flush()
+            except Exception:
+                app.logger.exception('Presence flush at exit failed')
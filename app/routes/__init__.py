@@ -0,0 +1,4 @@
+from app.routes import auth, browse, profile, settings, messages, forum, likes
+
+# Registered by create_app; endpoints are named after their blueprint, e.g. url_for('auth.login')
+blueprints = (auth.bp, browse.bp, profile.bp, settings.bp, messages.bp, forum.bp, likes.bp)
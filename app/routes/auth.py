@@ -0,0 +1,90 @@
+from time import perf_counter
+
+from flask import Blueprint, render_template, url_for, flash, redirect, request
+from flask_login import current_user, login_user, logout_user
+from werkzeug.urls import url_parse
+
+from app import db
+from app.forms import LoginForm, RegistrationForm
+from app.models import User
+from app.passwords import PasswordHasherBusy, login_seconds
+from app.presence import presence
+
+bp = Blueprint('auth', __name__)
+
+
+@bp.before_app_request
+def before_request():
+    if current_user.is_authenticated and request.endpoint not in ('static', 'profile.avatar'):
+        presence.touch(current_user.id, current_user.last_seen)
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+@bp.route('/login/', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('browse.browse'))
+    form = LoginForm()
+    if form.validate_on_submit():
+        start = perf_counter()
+        try:
+            return _login(form)
+        except PasswordHasherBusy:
+            flash(f'Too many people are signing in right now, please try again')
+            return redirect(url_for('auth.login'))
+        finally:
+            login_seconds.observe(perf_counter() - start)
+    return render_template('login.html', form=form, title='Login')
+
+
+def _login(form):
+    user = User.query.filter_by(username=form.username.data).first()
+    if user is None or not user.check_password(form.password.data):
+        flash(f'Invalid username or password')
+        return redirect(url_for('browse.browse'))
+    # Upgrade hashes made with outdated parameters while the plain password is at hand. The upgrade can wait
+    # for a later login when the hashing pool is busy; the password was already verified
+    if user.password_outdated():
+        try:
+            user.set_password(form.password.data)
+        except PasswordHasherBusy:
+            pass
+        else:
+            db.session.commit()
+    login_user(user, remember=form.remember_me.data)
+
+    next_page = request.args.get('next')
+    if presence.last_seen(user.id) or user.last_seen:
+        # Set next_page to browse if not set and also set it to browse in case external website is provided
+        if not next_page or url_parse(next_page).netloc != '':
+            next_page = url_for('browse.browse')
+    else:
+        next_page = url_for('settings.user_preferences')
+    return redirect(next_page)
+
+
+@bp.route('/logout')
+@bp.route('/logout/')
+def logout():
+    logout_user()
+    return redirect(url_for('browse.browse'))
+
+
+@bp.route('/register', methods=['GET', 'POST'])
+@bp.route('/register/', methods=['GET', 'POST'])
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for('browse.browse'))
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        user = User(username=form.username.data, email=form.email.data)
+        try:
+            user.set_password(password=form.password.data)
+        except PasswordHasherBusy:
+            flash(f'Too many people are registering right now, please try again')
+            return render_template('register.html', form=form, title='Register')
+        db.session.add(user)
+        db.session.commit()
+        flash(f'Thanks for registering!')
+        return redirect(url_for('auth.login'))
+    return render_template('register.html', form=form, title='Register')
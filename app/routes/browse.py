@@ -0,0 +1,103 @@
+import math
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, url_for, flash, redirect, request, jsonify
+from flask_login import current_user, login_required
+
+from app import answer_search, cursors, http_cache
+from app.geo import geo_index
+from app.matching import match_index
+from app.models import User, recently_active
+from app.presence import presence
+from app.search import search_index, is_searchable, partitions_for, visibility
+
+bp = Blueprint('browse', __name__)
+
+
+@bp.route('/')
+@bp.route('/browse')
+@bp.route('/browse/')
+@login_required
+def browse():
+    matches, next_cursor = _browse_page(request.args.get('cursor'))
+    # The page is built from what was just queried, so only the rendering is saved when it hasn't changed
+    tag = http_cache.etag('browse', current_user.username, next_cursor,
+                          [(user.id, user.username, user.avatar_hash, score, presence.is_online(user.id))
+                           for user, score in matches])
+    return http_cache.conditional(tag, lambda: render_template('browse.html', matches=matches, next_cursor=next_cursor,
+                                                               presence=presence, title='Browse'))
+
+
+@bp.route('/api/browse')
+@login_required
+def browse_feed():
+    matches, next_cursor = _browse_page(request.args.get('cursor'))
+    return jsonify(matches=[{'username': user.username, 'score': score, 'online': presence.is_online(user.id),
+                             'avatar': user.avatar(64), 'profile': url_for('profile.profile', username=user.username)}
+                            for user, score in matches],
+                   next=next_cursor)
+
+
+# One page of (user, score) pairs plus the signed cursor for the next page, or None on the last one.
+# Users with language preferences page through their ranked matches; others see recently active members
+def _browse_page(token):
+    per_page = current_app.config['BROWSE_PER_PAGE']
+    after = cursors.decode(token, 'browse')
+    if current_user.language_roles:
+        after = after[1:] if after and after[0] == 'matches' else None
+        ranked = match_index.feed(current_user.id, per_page, after)
+        users = {u.id: u for u in User.query.filter(User.id.in_([uid for uid, _, _ in ranked]))} if ranked else {}
+        # The index may predate a privacy change committed by another worker; the rows just loaded cannot
+        matches = [(users[uid], score) for uid, score, _ in ranked
+                   if uid in users and is_searchable(users[uid].privacy)]
+        last = ['matches', ranked[-1][1], ranked[-1][2], ranked[-1][0]] if len(ranked) == per_page else None
+    else:
+        after = (datetime.fromisoformat(after[1]), after[2]) if after and after[0] == 'recent' else None
+        users = recently_active(current_user.id, per_page, after)
+        matches = [(user, 0) for user in users]
+        last = ['recent', users[-1].last_seen.isoformat(), users[-1].id] if len(users) == per_page else None
+    return matches, cursors.encode(last, 'browse') if last else None
+
+
+@bp.route('/browse/nearby')
+@bp.route('/browse/nearby/')
+@login_required
+def nearby():
+    radius = request.args.get('radius', type=float)
+    # nan, infinite and non-positive radii fall back to the default; large ones are capped to bound the cell scan
+    if radius is None or not math.isfinite(radius) or radius <= 0:
+        radius = current_app.config['GEO_DEFAULT_RADIUS']
+    radius = min(radius, 500)
+    if current_user.latitude is None:
+        flash(f'Add a valid zip code to your settings to find people near you')
+        return redirect(url_for('settings.user_settings'))
+    found = geo_index.within(current_user.latitude, current_user.longitude, radius, exclude=current_user.id)
+    found = found[:current_app.config['MATCH_TOP_K']]
+    users = {u.id: u for u in User.query.filter(User.id.in_([uid for uid, _ in found]))} if found else {}
+    people = [(users[uid], distance) for uid, distance in found if uid in users and is_searchable(users[uid].privacy)]
+    return render_template('nearby.html', people=people, radius=radius, title='Near Me')
+
+
+@bp.route('/search')
+@bp.route('/search/')
+def search():
+    query = request.args.get('q', '').strip()
+    users = []
+    if query:
+        ids = search_index.prefix(query, current_user.is_authenticated)
+        found = {u.id: u for u in User.query.filter(User.id.in_(ids))} if ids else {}
+        partitions = partitions_for(current_user.is_authenticated)
+        users = [found[uid] for uid in ids if uid in found and visibility(found[uid].privacy) in partitions]
+    return render_template('search.html', query=query, users=users, title='Search')
+
+
+@bp.route('/search/answers')
+@bp.route('/search/answers/')
+def search_answers():
+    query = request.args.get('q', '').strip()
+    type = request.args.get('type', 'summary')
+    after = cursors.decode(request.args.get('cursor'), 'answer-search')
+    results, after = answer_search.search(query, type, current_user.is_authenticated, after)
+    next_cursor = cursors.encode(after, 'answer-search') if after else None
+    return render_template('answer_search.html', query=query, type=type, results=results,
+                           next_cursor=next_cursor, title='Search Answers')
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, url_for, redirect, request, abort
+from flask_login import current_user
+
+from app import db, cursors
+from app.catalog import languages as language_catalog
+from app.forms import ThreadForm, PostForm
+from app.forum import hot_threads, create_thread, reply, threads as forum_threads, posts as thread_posts
+from app.models import Thread
+
+bp = Blueprint('forum', __name__)
+
+
+@bp.route('/forum')
+@bp.route('/forum/')
+def forum():
+    return render_template('forum.html', languages=language_catalog.all(), hot=hot_threads.get(), title='Forum')
+
+
+@bp.route('/forum/<code>', methods=['GET', 'POST'])
+@bp.route('/forum/<code>/', methods=['GET', 'POST'])
+def forum_language(code):
+    language = language_catalog.by_code(code)
+    if language is None:
+        abort(404)
+    form = ThreadForm()
+    if request.method == 'POST' and not current_user.is_authenticated:
+        return current_app.login_manager.unauthorized()
+    if form.validate_on_submit():
+        thread = create_thread(language.id, current_user.id, form.title.data, form.body.data)
+        db.session.commit()
+        return redirect(url_for('forum.forum_thread', id=thread.id))
+    after = cursors.decode(request.args.get('cursor'), 'forum-threads')
+    after = (datetime.fromisoformat(after[1]), after[2]) if after and after[0] == language.id else None
+    page, last = forum_threads(language.id, current_app.config['FORUM_THREADS_PER_PAGE'], after)
+    next_cursor = cursors.encode([language.id, last[0].isoformat(), last[1]], 'forum-threads') if last else None
+    return render_template('forum_language.html', language=language, threads=page, next_cursor=next_cursor,
+                           hot=hot_threads.get(language.id), form=form, title=language.name + ' Forum')
+
+
+@bp.route('/forum/thread/<int:id>', methods=['GET', 'POST'])
+@bp.route('/forum/thread/<int:id>/', methods=['GET', 'POST'])
+def forum_thread(id):
+    thread = Thread.query.get_or_404(id)
+    form = PostForm()
+    if request.method == 'POST' and not current_user.is_authenticated:
+        return current_app.login_manager.unauthorized()
+    if form.validate_on_submit():
+        post = reply(thread.id, current_user.id, form.body.data)
+        db.session.commit()
+        # Land on the page that starts with the new reply
+        cursor = cursors.encode([thread.id, post.id - 1], 'forum-posts')
+        return redirect(url_for('forum.forum_thread', id=thread.id, cursor=cursor))
+    after = cursors.decode(request.args.get('cursor'), 'forum-posts')
+    after = after[1] if after and after[0] == thread.id else None
+    page, last = thread_posts(thread.id, current_app.config['FORUM_POSTS_PER_PAGE'], after)
+    next_cursor = cursors.encode([thread.id, last], 'forum-posts') if last else None
+    return render_template('forum_thread.html', thread=thread, language=language_catalog.get(thread.language_id),
+                           posts=page, next_cursor=next_cursor, form=form, title=thread.title)
@@ -0,0 +1,54 @@
+from flask import Blueprint, current_app, render_template, url_for, redirect
+from flask_login import current_user, login_required
+
+from app import db
+from app.forms import LikeForm
+from app.likes import like_graph, like, unlike
+from app.models import User
+from app.search import is_searchable
+
+bp = Blueprint('likes', __name__)
+
+
+# Separate, idempotent actions: a button rendered from an older state repeats what it says instead of undoing it
+@bp.route('/like/<username>', methods=['POST'])
+@bp.route('/like/<username>/', methods=['POST'])
+@login_required
+def like_user(username):
+    return _set_like(username, like)
+
+
+@bp.route('/unlike/<username>', methods=['POST'])
+@bp.route('/unlike/<username>/', methods=['POST'])
+@login_required
+def unlike_user(username):
+    return _set_like(username, unlike)
+
+
+def _set_like(username, action):
+    user = User.query.filter_by(username=username).first_or_404()
+    if LikeForm().validate_on_submit() and user.id != current_user.id:
+        action(current_user.id, user.id)
+        db.session.commit()
+    return redirect(url_for('profile.profile', username=username))
+
+
+@bp.route('/likes')
+@bp.route('/likes/')
+@login_required
+def likes():
+    config = current_app.config
+    mutual = like_graph.mutual(current_user.id)
+    admirers = like_graph.admirers(current_user.id)
+    suggested = like_graph.suggestions(current_user.id, config['LIKE_SUGGESTIONS'], config['LIKE_SUGGESTION_FANOUT'])
+    per_page = config['BROWSE_PER_PAGE']
+    # Newest members first; one query loads every user on the page
+    shown = mutual[::-1][:per_page].tolist(), admirers[::-1][:per_page].tolist(), [uid for uid, _ in suggested]
+    ids = set().union(*shown)
+    users = {u.id: u for u in User.query.filter(User.id.in_(ids))} if ids else {}
+    return render_template('likes.html', mutual=[users[uid] for uid in shown[0] if uid in users],
+                           mutual_count=len(mutual), admirers=[users[uid] for uid in shown[1] if uid in users],
+                           admirer_count=len(admirers),
+                           suggestions=[(users[uid], shared) for uid, shared in suggested
+                                        if uid in users and is_searchable(users[uid].privacy)],
+                           title='Likes')
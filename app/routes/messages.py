@@ -0,0 +1,71 @@
+from flask import Blueprint, current_app, render_template, url_for, redirect, request, jsonify
+from flask_login import current_user, login_required
+
+from app import db, cursors, messaging
+from app.forms import MessageForm
+from app.models import User
+
+bp = Blueprint('messages', __name__)
+
+
+@bp.route('/messages')
+@bp.route('/messages/')
+@login_required
+def messages():
+    conversations = messaging.conversations(current_user.id, current_app.config['MESSAGES_PER_PAGE'])
+    return render_template('messages.html', conversations=conversations, stream_url=_stream_url(), title='Messages')
+
+
+@bp.route('/messages/<username>', methods=['GET', 'POST'])
+@bp.route('/messages/<username>/', methods=['GET', 'POST'])
+@login_required
+def conversation(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    if user.id == current_user.id:
+        return redirect(url_for('messages.messages'))
+    form = MessageForm()
+    if form.validate_on_submit():
+        conversation = messaging.start_conversation(current_user.id, user.id)
+        messaging.send(conversation, current_user.id, form.body.data)
+        db.session.commit()
+        return redirect(url_for('messages.conversation', username=username))
+    conversation = messaging.find_conversation(current_user.id, user.id)
+    page, older = _message_page(conversation, request.args.get('cursor'))
+    # Opening the newest page reads the conversation
+    if page and not request.args.get('cursor'):
+        messaging.mark_read(conversation.id, current_user.id, page[-1].id)
+        db.session.commit()
+    people = {current_user.id: current_user, user.id: user}
+    return render_template('conversation.html', user=user, conversation=conversation, messages=page, people=people,
+                           older=older, form=form, stream_url=_stream_url(), title=username)
+
+
+@bp.route('/api/messages/<username>')
+@login_required
+def conversation_history(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    conversation = messaging.find_conversation(current_user.id, user.id)
+    page, older = _message_page(conversation, request.args.get('cursor'))
+    people = {current_user.id: current_user.username, user.id: user.username}
+    return jsonify(messages=[messaging.payload(message, people[message.sender_id]) for message in page], next=older)
+
+
+@bp.route('/api/messages/unread')
+@login_required
+def unread_messages():
+    counts = messaging.unread_counts(current_user.id)
+    return jsonify(total=sum(counts.values()), conversations={str(k): v for k, v in counts.items()})
+
+
+# One page of a conversation, oldest message first, plus the signed cursor for the page before it
+def _message_page(conversation, token):
+    if conversation is None:
+        return [], None
+    before = cursors.decode(token, 'messages')
+    before = before[1] if before and before[0] == conversation.id else None
+    page, older = messaging.history(conversation.id, current_app.config['MESSAGES_PER_PAGE'], before)
+    return page, cursors.encode([conversation.id, older], 'messages') if older else None
+
+
+def _stream_url():
+    return '{}?token={}'.format(current_app.config['MESSAGE_STREAM_URL'], messaging.stream_token(current_user.id))
@@ -0,0 +1,108 @@
+from flask import Blueprint, current_app, render_template, url_for, flash, redirect, request, abort, send_file
+from flask_login import current_user, login_required
+from markupsafe import Markup
+
+from app import db, avatars, answer_search, http_cache
+from app.catalog import questions as catalog
+from app.forms import AnswerForm, LikeForm
+from app.fragments import fragments
+from app.likes import likes
+from app.models import User, Answer, load_user_answers, profile_version
+from app.search import details_visible
+
+bp = Blueprint('profile', __name__)
+
+
+@bp.route('/profile')
+@bp.route('/profile/')
+@login_required
+def user_profile():
+    return redirect(url_for('profile.profile', username=current_user.username))
+
+
+@bp.route('/profile/<username>', methods=['GET', 'POST'])
+@bp.route('/profile/<username>/', methods=['GET', 'POST'])
+def profile(username):
+    # One indexed query decides whether the browser's copy is current; only a changed profile is rendered
+    version = profile_version(username)
+    if version is None:
+        abort(404)
+    liked = None
+    if current_user.is_authenticated and current_user.id != version.id:
+        liked = likes(current_user.id, version.id)
+    catalog_version = catalog.current_version()
+    tag = http_cache.etag('profile', tuple(version), _viewer_class(version.id), liked, catalog_version)
+    return http_cache.conditional(tag, lambda: _render_profile(version, liked, catalog_version))
+
+
+def _render_profile(version, liked, catalog_version):
+    viewer = _viewer_class(version.id)
+    html = fragments.get(version, viewer, catalog_version)
+    if html is None:
+        # Rendered from rows read after the version, so an entry is never older than its key
+        user = User.query.get_or_404(version.id)
+        questions = catalog.by_type('summary')
+        answers = load_user_answers(user, questions)
+        show_details = viewer == 'owner' or details_visible(user.privacy, current_user.is_authenticated)
+        html = render_template('_profile.html', user=user, questions=questions, answers=answers,
+                               show_details=show_details)
+        fragments.set(version, viewer, catalog_version, html)
+    return render_template('profile.html', fragment=Markup(html), username=version.username, liked=liked,
+                           like_form=LikeForm(), title=version.username)
+
+
+def _viewer_class(user_id):
+    if not current_user.is_authenticated:
+        return 'anonymous'
+    return 'owner' if current_user.id == user_id else 'registered'
+
+
+@bp.route('/avatar/<digest>/<int:size>')
+def avatar(digest, size):
+    if not avatars.is_valid(digest, size):
+        abort(404)
+    etag = avatars.etag(digest, size)
+    # Validate before touching the disk: browsers revalidating a cached avatar never cost a file read
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        path = avatars.thumbnail(digest, size)
+        if path is None:
+            abort(404)
+        response = send_file(path, mimetype='image/png')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(current_app.config['AVATAR_MAX_AGE'])
+    return response
+
+
+@bp.route('/answer/<int:id>', methods=['GET', 'POST'])
+@bp.route('/answer/<int:id>/', methods=['GET', 'POST'])
+@login_required
+def answer(id):
+    # Figure out if answer already exists
+    question = catalog.get(id)
+    if question is None:
+        abort(404)
+    answer = Answer.query.filter_by(user_id=current_user.id, question_id=question.id).first()
+
+    form = AnswerForm()
+    # If answer doesn't yet exist
+    if answer is None:
+        if form.validate_on_submit():
+            answer = Answer(body=form.body.data, user_id=current_user.id, question_id=question.id)
+            db.session.add(answer)
+            db.session.flush()
+            answer_search.index(answer, question.type)
+            db.session.commit()
+            flash(f'Your response has been recorded')
+            return redirect(url_for('profile.profile', username=current_user.username))
+    elif request.method == 'GET':
+        form.body.data = answer.body
+    # Validate an existing answer
+    elif form.validate_on_submit():
+        answer.body = form.body.data
+        answer_search.index(answer, question.type)
+        db.session.commit()
+        flash(f'Your response has been edited')
+        return redirect(url_for('profile.profile', username=current_user.username))
+    return render_template('answer.html', form=form, question=question, title='Answer')
@@ -0,0 +1,102 @@
+from flask import Blueprint, current_app, render_template, url_for, flash, redirect, request
+from flask_login import current_user, login_required
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app import db, avatars, http_cache, jobs
+from app.catalog import languages as language_catalog
+from app.forms import AvatarForm, UserSettingsForm, preferences_form
+from app.geo import locate
+from app.matching import encode_roles, role_bits, role_codes
+from app.models import UserLanguage, attach, save_user_languages
+
+bp = Blueprint('settings', __name__)
+
+
+@bp.route('/settings')
+@bp.route('/settings/')
+@login_required
+def settings_menu():
+    return http_cache.conditional(http_cache.etag('settings_menu'),
+                                  lambda: render_template('settings_menu.html', title='Settings'))
+
+
+@bp.route('/settings/avatar', methods=['GET', 'POST'])
+@bp.route('/settings/avatar/', methods=['GET', 'POST'])
+@login_required
+def user_avatar():
+    form = AvatarForm()
+    if form.validate_on_submit():
+        try:
+            digest = avatars.save_source(form.image.data.read())
+        except ValueError as e:
+            form.image.errors.append(str(e))
+        else:
+            attach(current_user._get_current_object()).avatar_hash = digest
+            jobs.enqueue('avatars.warm', digest=digest)
+            db.session.commit()
+            flash(f'Your profile picture has been updated')
+            return redirect(url_for('settings.settings_menu'))
+    return render_template('user_avatar.html', form=form, title='Profile Picture')
+
+
+@bp.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    # Flask refuses bodies over MAX_CONTENT_LENGTH before the form sees them
+    flash(f'Uploads cannot be larger than {current_app.config["MAX_CONTENT_LENGTH"] // (1024 * 1024)} MB')
+    return redirect(url_for('settings.user_avatar'))
+
+
+@bp.route('/preferences', methods=['GET', 'POST'])
+@bp.route('/preferences/', methods=['GET', 'POST'])
+@login_required
+def user_preferences():
+    languages = language_catalog.all()
+    form = preferences_form(languages)
+    if request.method == 'GET':
+        saved = {row.language_id: row for row in UserLanguage.query.filter_by(user_id=current_user.id)}
+        for language in languages:
+            row = saved.get(language.id)
+            if row is not None:
+                form[language.code].data = role_codes(row.roles)
+                form[language.code + '_body'].data = row.body
+    elif form.validate_on_submit():
+        rows = [{'language_id': language.id, 'roles': role_bits(form[language.code].data),
+                 'body': form[language.code + '_body'].data} for language in languages]
+        save_user_languages(current_user.id, rows)
+        attach(current_user._get_current_object()).language_roles = encode_roles(
+            {language.position: row['roles'] for language, row in zip(languages, rows)})
+        db.session.commit()
+        flash(f'Your preferences have been updated')
+        return redirect(url_for('settings.settings_menu'))
+    return render_template('user_preferences.html', form=form, languages=languages, title='Preferences')
+
+
+@bp.route('/user_settings', methods=['GET', 'POST'])
+@bp.route('/user_settings/', methods=['GET', 'POST'])
+@login_required
+def user_settings():
+    form = UserSettingsForm(current_user.email, current_user.username)
+    if request.method == 'GET':
+        form.email.data = current_user.email
+        form.username.data = current_user.username
+        form.gender.data = current_user.gender
+        form.birthday.data = current_user.birthday
+        form.city.data = current_user.city
+        form.state.data = current_user.state
+        form.zip_code.data = current_user.zip_code
+        form.privacy.data = current_user.privacy
+    elif form.validate_on_submit():
+        user = attach(current_user._get_current_object())
+        user.email = form.email.data
+        user.username = form.username.data
+        user.gender = form.gender.data
+        user.birthday = form.birthday.data
+        user.city = form.city.data
+        user.state = form.state.data
+        user.zip_code = form.zip_code.data
+        user.latitude, user.longitude = locate(form.zip_code.data) or (None, None)
+        user.privacy = form.privacy.data
+        db.session.commit()
+        flash(f'Your settings have been updated')
+        return redirect(url_for('settings.settings_menu'))
+    return render_template('user_settings.html', form=form, title='User Settings')
@@ -0,0 +1,110 @@
+from bisect import bisect_left, insort
+from heapq import merge
+from itertools import islice
+from threading import Lock
+
+from app import db, events
+from app.catalog import VersionStamp
+from app.extensions import AppLocal
+from app.models import User
+
+# Privacy levels 1 and 3 appear in searches for everyone, level 2 only for registered users
+# and level 4 never does
+PUBLIC = 'public'
+REGISTERED = 'registered'
+HIDDEN = 'hidden'
+
+
+def visibility(privacy):
+    if privacy == '4':
+        return HIDDEN
+    if privacy == '2':
+        return REGISTERED
+    return PUBLIC
+
+
+def is_searchable(privacy):
+    return visibility(privacy) != HIDDEN
+
+
+def details_visible(privacy, authenticated):
+    # Whether a viewer may see profile details such as answers, as opposed to just the username
+    return privacy in (None, '1') or (privacy == '2' and authenticated)
+
+
+def partitions_for(authenticated):
+    return (PUBLIC, REGISTERED) if authenticated else (PUBLIC,)
+
+
+class UserSearchIndex():
+    # Usernames kept sorted per visibility class, so a search only ever reads the partitions its viewer may see.
+    # Commits in this worker patch the index; commits in other workers move its stamp and cause a rebuild
+
+    def __init__(self):
+        self.lock = Lock()
+        self.partitions = None  # visibility class -> sorted [(lowercase username, id)]
+        self.entries = {}  # user id -> (visibility class, lowercase username)
+        self.dirty = set()
+        self.stamp = None
+        self.version = None
+
+    def init_app(self, app):
+        self.stamp = VersionStamp(app.config['SEARCH_INDEX_STAMP'], app.config['USER_INDEX_CHECK_INTERVAL'])
+        self.partitions = None
+
+    def build(self):
+        self.partitions = {PUBLIC: [], REGISTERED: [], HIDDEN: []}
+        self.entries = {}
+        for uid, username, privacy in db.session.query(User.id, User.username, User.privacy):
+            entry = (visibility(privacy), username.lower())
+            self.entries[uid] = entry
+            self.partitions[entry[0]].append((entry[1], uid))
+        for names in self.partitions.values():
+            names.sort()
+        self.dirty = set()
+
+    def mark_dirty(self, user_ids):
+        with self.lock:
+            self.dirty |= user_ids
+            self.version = self.stamp.advance(self.version)
+
+    def _sync(self):
+        if self.partitions is None or (self.stamp.due() and self.stamp.read() != self.version):
+            self.version = self.stamp.read()
+            self.build()
+        elif self.dirty:
+            user_ids, self.dirty = self.dirty, set()
+            rows = db.session.query(User.id, User.username, User.privacy).filter(User.id.in_(user_ids)).all()
+            for uid in user_ids:
+                entry = self.entries.pop(uid, None)
+                if entry is not None:
+                    names = self.partitions[entry[0]]
+                    del names[bisect_left(names, (entry[1], uid))]
+            for uid, username, privacy in rows:
+                entry = (visibility(privacy), username.lower())
+                self.entries[uid] = entry
+                insort(self.partitions[entry[0]], (entry[1], uid))
+
+    def is_visible(self, user_id, authenticated):
+        with self.lock:
+            self._sync()
+            entry = self.entries.get(user_id)
+        return entry is not None and entry[0] in partitions_for(authenticated)
+
+    def prefix(self, query, authenticated, limit=20):
+        # User ids whose username starts with query, alphabetically, drawn only from visible partitions
+        query = query.lower()
+        with self.lock:
+            self._sync()
+            ranges = []
+            for partition in partitions_for(authenticated):
+                names = self.partitions[partition]
+                start = bisect_left(names, (query,))
+                ranges.append(names[start:start + limit])
+            found = [entry for entry in islice(merge(*ranges), limit) if entry[0].startswith(query)]
+        return [uid for _, uid in found]
+
+
+search_index = AppLocal('search_index', UserSearchIndex)
+
+events.on_commit(User, columns=('username', 'privacy'))(search_index.hook('mark_dirty'))
@@ -0,0 +1,235 @@
+"""Latency, queries per request and throughput for the login, profile, answer, settings and browse paths.
+
+Seeds a throwaway database through the app's own models, then drives the Flask test client (default) or a
+local WSGI server (--wsgi) through each path:
+
+    python benchmarks/hotpaths.py --users 2000 --requests 300 --output bench.json
+    python benchmarks/hotpaths.py --baseline bench.json --tolerance 0.2
+
+With --baseline the run exits with status 1 when a path's p95 latency grew by more than the tolerance or it
+issues more queries per request than before.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+PASSWORD = 'benchmark-password'
+LANGUAGES = [('english', 'English'), ('french', 'French'), ('german', 'German'), ('spanish', 'Spanish')]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def seed(app, db, users, questions, seed_value):
+    from app.matching import encode_roles
+    from app.models import User, Question, Answer, Preference, Language, UserLanguage
+    from app.passwords import hash_password
+    rng = random.Random(seed_value)
+    with app.app_context():
+        db.create_all()
+        # Hash once and share it: seeding should not spend minutes in pbkdf2
+        password_hash = hash_password(PASSWORD)
+        db.session.bulk_insert_mappings(Language, [{'id': i + 1, 'code': code, 'name': name, 'position': i}
+                                                   for i, (code, name) in enumerate(LANGUAGES)])
+        db.session.bulk_insert_mappings(Question, [{'id': i + 1, 'body': 'Summary question {}'.format(i + 1),
+                                                    'type': 'summary'} for i in range(questions)])
+        now = datetime.utcnow()
+        user_rows = []
+        language_rows = []
+        answer_rows = []
+        preference_rows = []
+        for uid in range(1, users + 1):
+            selected = {}
+            for position in range(len(LANGUAGES)):
+                roles = rng.choice((0, 0, 1, 2, 4, 3))
+                if roles:
+                    language_rows.append({'user_id': uid, 'language_id': position + 1, 'roles': roles, 'body': None})
+                    selected[position] = roles
+            user_rows.append({'id': uid, 'username': 'user{}'.format(uid), 'email': 'user{}@example.com'.format(uid),
+                              'password_hash': password_hash, 'language_roles': encode_roles(selected),
+                              'privacy': rng.choice(('1', '1', '1', '2', '3', '4')),
+                              'last_seen': now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))})
+            for qid in rng.sample(range(1, questions + 1), rng.randint(0, questions)):
+                answer_rows.append({'id': len(answer_rows) + 1, 'user_id': uid, 'question_id': qid, 'timestamp': now,
+                                    'body': 'Answer from user {} to question {}'.format(uid, qid)})
+                if rng.random() < 0.2:
+                    preference_rows.append({'user_id': uid, 'question_id': qid, 'answer_id': len(answer_rows)})
+        db.session.bulk_insert_mappings(User, user_rows)
+        db.session.bulk_insert_mappings(UserLanguage, language_rows)
+        db.session.bulk_insert_mappings(Answer, answer_rows)
+        db.session.bulk_insert_mappings(Preference, preference_rows)
+        db.session.commit()
+
+
+class TestClient():
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def post(self, path, data):
+        return self.client.post(path, data=data).status_code
+
+
+class WsgiClient():
+    # urllib against a werkzeug server in a background thread; redirects are not followed, like the test client
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                                                  self._NoRedirect())
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def get(self, path):
+        return self._open(urllib.request.Request(self.base_url + path))
+
+    def post(self, path, data):
+        return self._open(urllib.request.Request(self.base_url + path, urllib.parse.urlencode(data).encode()))
+
+
+def start_server(app):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return 'http://127.0.0.1:{}'.format(server.server_port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=200, help='requests per path')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--wsgi', action='store_true', help='go through a local WSGI server instead of the test client')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative p95 growth')
+    args = parser.parse_args()
+
+    # Config reads the environment when it is imported
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'bench.db')
+    from sqlalchemy import event
+    from app import create_app, db
+    from config import Config
+
+    class BenchConfig(Config):
+        WTF_CSRF_ENABLED = False
+        AVATAR_SOURCE_DIR = os.path.join(directory, 'avatars')
+        AVATAR_CACHE_DIR = os.path.join(directory, 'avatars', 'cache')
+
+    # Stamps and change logs as well, so a run neither follows nor disturbs the workers sharing instance/
+    for name in dir(Config):
+        if name.endswith(('_STAMP', '_CHANGES')):
+            setattr(BenchConfig, name, os.path.join(directory, name.lower()))
+    app = create_app(BenchConfig)
+    seed(app, db, args.users, args.questions, args.seed)
+
+    # Requests run one at a time, so a plain counter works for both clients (--wsgi executes on the server thread)
+    queries = {'count': 0}
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(*_):
+            queries['count'] += 1
+
+    base_url = start_server(app) if args.wsgi else None
+
+    def new_client():
+        return WsgiClient(base_url) if args.wsgi else TestClient(app)
+
+    rng = random.Random(args.seed)
+    user_ids = list(range(1, args.users + 1))
+    sessions = []
+    for uid in rng.sample(user_ids, min(20, args.users)):
+        client = new_client()
+        client.post('/login/', {'username': 'user{}'.format(uid), 'password': PASSWORD})
+        sessions.append(client)
+
+    def login():
+        return new_client().post('/login/', {'username': 'user{}'.format(rng.choice(user_ids)), 'password': PASSWORD})
+
+    paths = [
+        ('login', login),
+        ('profile', lambda: rng.choice(sessions).get('/profile/user{}/'.format(rng.choice(user_ids)))),
+        ('answer', lambda: rng.choice(sessions).get('/answer/{}/'.format(rng.randint(1, args.questions)))),
+        ('answer_submit', lambda: rng.choice(sessions).post('/answer/{}/'.format(rng.randint(1, args.questions)),
+                                                            {'body': 'Benchmark answer {}'.format(rng.random())})),
+        ('user_settings', lambda: rng.choice(sessions).get('/user_settings/')),
+        ('browse', lambda: rng.choice(sessions).get('/browse/')),
+    ]
+
+    results = {}
+    print('{:<14} {:>9} {:>9} {:>9} {:>9} {:>9}'.format('path', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'req/s'))
+    for name, request in paths:
+        latencies = []
+        query_counts = []
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            queries['count'] = 0
+            start = time.perf_counter()
+            status = request()
+            latencies.append((time.perf_counter() - start) * 1000)
+            query_counts.append(queries['count'])
+            if status >= 400:
+                raise SystemExit('{} returned HTTP {}'.format(name, status))
+        elapsed = time.perf_counter() - started
+        results[name] = {'p50': percentile(latencies, 50), 'p95': percentile(latencies, 95),
+                         'p99': percentile(latencies, 99), 'queries': sum(query_counts) / len(query_counts),
+                         'rps': args.requests / elapsed}
+        r = results[name]
+        print('{:<14} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.0f}'.format(
+            name, r['p50'], r['p95'], r['p99'], r['queries'], r['rps']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = []
+        for name, r in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if r['p95'] > before['p95'] * (1 + args.tolerance):
+                regressions.append('{}: p95 {:.2f} ms -> {:.2f} ms'.format(name, before['p95'], r['p95']))
+            if r['queries'] > before['queries'] + 0.01:
+                regressions.append('{}: queries/request {:.2f} -> {:.2f}'.format(name, before['queries'], r['queries']))
+        for line in regressions:
+            print('REGRESSION ' + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
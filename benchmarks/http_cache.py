@@ -0,0 +1,89 @@
+"""Bytes sent and server CPU per request for the pages served with ETags and compression.
+
+Seeds a throwaway database like hotpaths.py, logs a few members in with the Flask test client and requests
+the profile, browse and settings pages three ways:
+
+    python benchmarks/http_cache.py --users 1000 --requests 300
+
+plain       no Accept-Encoding and no validator, what every request cost before
+gzip        Accept-Encoding: gzip, br (brotli is only used when the brotli package is installed)
+revalidate  If-None-Match with the ETag of an earlier response, which is answered 304 when nothing changed
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from hotpaths import PASSWORD, seed
+
+MODES = ('plain', 'gzip', 'revalidate')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=200, help='requests per page and mode')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    # Config reads the environment when it is imported
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'bench.db')
+    from app import create_app, db
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    seed(app, db, args.users, args.questions, args.seed)
+
+    rng = random.Random(args.seed)
+    sessions = []
+    for uid in rng.sample(range(1, args.users + 1), min(20, args.users)):
+        client = app.test_client()
+        client.post('/login/', data={'username': 'user{}'.format(uid), 'password': PASSWORD})
+        sessions.append(client)
+    profiles = rng.sample(range(1, args.users + 1), min(50, args.users))
+    pages = {
+        'profile': ['/profile/user{}/'.format(uid) for uid in profiles],
+        'browse': ['/browse/'],
+        'settings': ['/settings/'],
+    }
+
+    results = {}
+    print('{:<10} {:<11} {:>10} {:>8} {:>10}'.format('page', 'mode', 'bytes/req', 'status', 'cpu ms/req'))
+    for page, paths in pages.items():
+        requests = [(rng.choice(sessions), rng.choice(paths)) for _ in range(args.requests)]
+        # The validators a browser would hold from its last visit to each page
+        tags = {(id(client), path): client.get(path).headers.get('ETag') for client, path in set(requests)}
+        results[page] = {}
+        for mode in MODES:
+            sizes, statuses = [], set()
+            start = time.process_time()
+            for client, path in requests:
+                headers = {}
+                if mode != 'plain':
+                    headers['Accept-Encoding'] = 'gzip, br'
+                if mode == 'revalidate':
+                    headers['If-None-Match'] = tags[id(client), path]
+                response = client.get(path, headers=headers)
+                sizes.append(len(response.get_data()))
+                statuses.add(response.status_code)
+            cpu = (time.process_time() - start) / len(requests) * 1000
+            r = results[page][mode] = {'bytes': statistics.mean(sizes), 'cpu_ms': cpu, 'status': sorted(statuses)}
+            print('{:<10} {:<11} {:>10.0f} {:>8} {:>10.2f}'.format(
+                page, mode, r['bytes'], '/'.join(map(str, r['status'])), r['cpu_ms']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Read throughput on SQLite while other threads keep writing, with the default settings and with the
+production profile's pragmas from Config.SQLITE_PRAGMAS.
+
+    python benchmarks/sqlite_concurrency.py --readers 8 --writers 2 --seconds 10
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from config import Config  # noqa: E402
+
+
+def connect(path, pragmas):
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+    for name, value in pragmas.items():
+        conn.execute('PRAGMA {} = {}'.format(name, value))
+    return conn
+
+
+def seed(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(40), last_seen DATETIME)')
+    conn.executemany('INSERT INTO user (id, username, last_seen) VALUES (?, ?, ?)',
+                     ((i, 'user{}'.format(i), None) for i in range(1, rows + 1)))
+    conn.commit()
+    conn.close()
+
+
+def run(pragmas, readers, writers, seconds, rows):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.db')
+    seed(path, rows)
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def worker(write):
+        conn = connect(path, pragmas)
+        done = errors = 0
+        while not stop.is_set():
+            uid = random.randint(1, rows)
+            try:
+                if write:
+                    # Mirrors the old before_request: one small write transaction per page view
+                    conn.execute('UPDATE user SET last_seen = ? WHERE id = ?', (datetime.utcnow().isoformat(), uid))
+                    conn.commit()
+                else:
+                    conn.execute('SELECT id, username, last_seen FROM user WHERE id = ?', (uid,)).fetchone()
+                done += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        conn.close()
+        with lock:
+            counts['writes' if write else 'reads'] += done
+            counts['errors'] += errors
+
+    threads = [threading.Thread(target=worker, args=(False,)) for _ in range(readers)] + \
+              [threading.Thread(target=worker, args=(True,)) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {k: v / seconds for k, v in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    print('{:<12} {:>12} {:>12} {:>12}'.format('profile', 'reads/s', 'writes/s', 'errors/s'))
+    for name, pragmas in (('default', {}), ('production', Config.SQLITE_PRAGMAS)):
+        result = run(pragmas, args.readers, args.writers, args.seconds, args.rows)
+        print('{:<12} {:>12.0f} {:>12.0f} {:>12.1f}'.format(name, result['reads'], result['writes'], result['errors']))
+
+
+if __name__ == '__main__':
+    main()
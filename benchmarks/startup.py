@@ -0,0 +1,91 @@
+"""Cold start cost of a web worker and of a flask command.
+
+Every sample runs in a fresh interpreter so nothing is already in sys.modules:
+
+    python benchmarks/startup.py --runs 10
+
+worker  imports the app package and builds it with create_app(), as `gunicorn 'app:create_app()'` does
+cli     imports langmatch, the FLASK_APP module, and builds its create_app() as every flask command does
+
+For each it reports the import time, the create_app() time, the latency of the first two requests a new
+process serves (/login/ renders a template, /forum/ also queries the database) and which heavy
+dependencies were loaded by then.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+HEAVY = ('alembic', 'numpy', 'PIL', 'redis')
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+if sys.argv[1] == 'cli':
+    import langmatch
+    imported = time.perf_counter()
+    app = langmatch.create_app()
+    created = time.perf_counter()
+else:
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+client = app.test_client()
+timings = {'import': imported - start, 'create': created - imported}
+for name, path in (('login', '/login/'), ('forum', '/forum/')):
+    before = time.perf_counter()
+    status = client.get(path).status_code
+    timings[name] = time.perf_counter() - before
+    if status != 200:
+        raise SystemExit('{} returned HTTP {}'.format(path, status))
+timings['total'] = time.perf_counter() - start
+timings['modules'] = [name for name in sys.argv[2:] if name in sys.modules]
+print(json.dumps(timings))
+'''
+
+
+def sample(mode, env):
+    output = subprocess.run([sys.executable, '-c', CHILD, mode] + list(HEAVY), cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters per mode')
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(directory, 'startup.db'),
+               FLASK_APP='langmatch.py', PYTHONDONTWRITEBYTECODE='1')
+    setup = 'import langmatch\nwith langmatch.create_app().app_context(): langmatch.db.create_all()'
+    subprocess.run([sys.executable, '-c', setup], cwd=ROOT, env=env, check=True)
+    # One untimed run per mode so every sample reads warm bytecode and file system caches
+    for mode in ('worker', 'cli'):
+        sample(mode, env)
+
+    results = {}
+    print('{:<8} {:>10} {:>10} {:>10} {:>10} {:>10}  {}'.format(
+        'mode', 'import ms', 'create ms', 'login ms', 'forum ms', 'total ms', 'heavy modules loaded'))
+    for mode in ('worker', 'cli'):
+        runs = [sample(mode, env) for _ in range(args.runs)]
+        r = {key: statistics.median(run[key] for run in runs) * 1000
+             for key in ('import', 'create', 'login', 'forum', 'total')}
+        r['modules'] = runs[-1]['modules']
+        results[mode] = r
+        print('{:<8} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}  {}'.format(
+            mode, r['import'], r['create'], r['login'], r['forum'], r['total'], ', '.join(r['modules']) or '-'))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,7 @@
 import os
+
+from sqlalchemy.pool import QueuePool
+
 basedir = os.path.abspath(os.path.dirname(__file__))  # get absolute path of folder name
 
 
@@ -7,3 +10,137 @@ class Config():
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # 'production' applies SQLITE_PRAGMAS to every SQLite connection, or pools connections to a server database
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE') or 'default'
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # readers no longer wait for the writer
+        'synchronous': 'NORMAL',  # fsync at checkpoints only, still durable in WAL mode
+        'busy_timeout': 5000,  # milliseconds to wait for the write lock before raising "database is locked"
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -16000,  # KiB
+    }
+    # SQLAlchemy opens a new SQLite file connection, and so reruns the pragmas, on every checkout unless it is pooled
+    SQLITE_ENGINE_OPTIONS = {
+        'poolclass': QueuePool,
+        'pool_size': int(os.environ.get('DATABASE_POOL_SIZE') or 10),
+        'max_overflow': int(os.environ.get('DATABASE_MAX_OVERFLOW') or 20),
+        'connect_args': {'check_same_thread': False},  # the pool hands each connection to one thread at a time
+    }
+    SERVER_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DATABASE_POOL_SIZE') or 10),
+        'max_overflow': int(os.environ.get('DATABASE_MAX_OVERFLOW') or 20),
+        'pool_recycle': 1800,  # seconds, below typical server idle timeouts
+        'pool_pre_ping': True,
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {} if DATABASE_PROFILE != 'production' else \
+        SQLITE_ENGINE_OPTIONS if SQLALCHEMY_DATABASE_URI.startswith('sqlite') else SERVER_ENGINE_OPTIONS
+
+    AVATAR_SOURCE_DIR = os.path.join(basedir, 'avatars')
+    AVATAR_CACHE_DIR = os.path.join(basedir, 'avatars', 'cache')
+    AVATAR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    AVATAR_SIZES = (32, 64, 128, 256)
+    AVATAR_DEFAULT_COLOR = (200, 200, 200)
+    AVATAR_MAX_AGE = 365 * 24 * 60 * 60
+    AVATAR_MAX_PIXELS = 16 * 1024 * 1024  # width * height; larger uploads are refused before they are decoded
+    MAX_CONTENT_LENGTH = 8 * 1024 * 1024  # bytes per request body, enforced by Flask
+
+    MATCH_TOP_K = 50
+
+    # last_seen is buffered in memory and written back in batches
+    PRESENCE_FLUSH_INTERVAL = 60  # seconds
+    PRESENCE_FLUSH_THRESHOLD = 500  # users
+    PRESENCE_THROTTLE = 60  # seconds
+    PRESENCE_ONLINE_WINDOW = 300  # seconds
+
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 60  # seconds
+
+    GEO_ZIP_TABLE = os.environ.get('GEO_ZIP_TABLE') or os.path.join(basedir, 'app', 'data', 'zip_centroids.csv')
+    GEO_CELL_DEGREES = 0.5
+    GEO_DEFAULT_RADIUS = 25  # miles
+
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:150000'
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = 4
+    PASSWORD_HASH_QUEUE = 16  # extra callers allowed to wait for a hashing thread
+    PASSWORD_HASH_TIMEOUT = 5  # seconds to wait for a slot before refusing the request
+
+    # Touched whenever questions or languages change so every worker reloads its in-memory catalog
+    QUESTION_CATALOG_STAMP = os.path.join(basedir, 'instance', 'questions.stamp')
+    LANGUAGE_CATALOG_STAMP = os.path.join(basedir, 'instance', 'languages.stamp')
+    CATALOG_CHECK_INTERVAL = 5  # seconds
+
+    # Touched when a worker commits a change to the users behind an in-memory index, so the others rebuild theirs.
+    # Pages re-check privacy on the rows they load, so a stale index can misorder results but never leak a hidden user
+    SEARCH_INDEX_STAMP = os.path.join(basedir, 'instance', 'search_index.stamp')
+    GEO_INDEX_STAMP = os.path.join(basedir, 'instance', 'geo_index.stamp')
+    # The match index instead shares the ids of changed users, so the others refresh just those rows
+    MATCH_INDEX_CHANGES = os.path.join(basedir, 'instance', 'match_index.changes')
+    MATCH_INDEX_CHANGES_MAX_BYTES = 1024 * 1024  # the log starts over past this size and every worker rebuilds
+    USER_INDEX_CHECK_INTERVAL = 30  # seconds
+
+    # Without FTS5 every worker keeps its own answer search index and re-reads recently written answers
+    ANSWER_SEARCH_SYNC_INTERVAL = 5  # seconds between checks for answers written by other workers
+    ANSWER_SEARCH_SYNC_OVERLAP = 60  # seconds of answers read again each time, for clock skew and late commits
+
+    # 'local' keeps rendered profile fragments in each worker; 'redis' shares them through FRAGMENT_CACHE_URL
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND') or 'local'
+    FRAGMENT_CACHE_URL = os.environ.get('FRAGMENT_CACHE_URL') or 'redis://localhost:6379/0'
+    FRAGMENT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+    FRAGMENT_CACHE_TTL = 24 * 60 * 60  # seconds, redis backend only
+
+    BROWSE_PER_PAGE = 20
+
+    # Per-request SQL and template timings are always exported on /metrics; SERVER_TIMING also sends them to the
+    # browser in a Server-Timing header. Requests slower than SLOW_REQUEST_THRESHOLD seconds are logged
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+    SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD') or 0.5)
+    SLOW_STATEMENTS_TRACKED = 20
+    # /metrics shows normalised SQL, so it answers only scrapers sending "Authorization: Bearer METRICS_TOKEN" or
+    # connecting from METRICS_ALLOWED_IPS, and is a 404 when neither is set. Behind a reverse proxy on the same host
+    # every client connects from the proxy's address, so use the token there
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_ALLOWED_IPS = tuple(ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip.strip())
+
+    # New messages are pushed by a separate asyncio process (flask messages stream) over server-sent events
+    MESSAGE_STREAM_URL = os.environ.get('MESSAGE_STREAM_URL') or 'http://localhost:5001/stream'
+    MESSAGE_STREAM_HOST = os.environ.get('MESSAGE_STREAM_HOST') or '127.0.0.1'
+    MESSAGE_STREAM_PORT = int(os.environ.get('MESSAGE_STREAM_PORT') or 5001)
+    MESSAGE_STREAM_TOKEN_MAX_AGE = 12 * 60 * 60  # seconds
+    MESSAGE_POLL_INTERVAL = 1  # seconds between the stream's new-message queries
+    MESSAGE_POLL_OVERLAP = 10  # seconds a message may take to commit after a later one was delivered
+    MESSAGE_HEARTBEAT = 15  # seconds between keepalive comments on idle streams
+    MESSAGES_PER_PAGE = 50
+
+    FORUM_THREADS_PER_PAGE = 25
+    FORUM_POSTS_PER_PAGE = 25
+    FORUM_HOT_INTERVAL = 60  # seconds between recomputations of the hot thread ranking
+    FORUM_HOT_WINDOW = 7  # days of activity considered for the ranking
+    FORUM_HOT_LIMIT = 10
+
+    # Per-worker cache of each user's like edges as sorted id arrays. Commits drop the arrays they change in every
+    # worker: the committing one at once, the others through LIKE_GRAPH_CHANGES
+    LIKE_CACHE_SIZE = 4096  # users, each with an outgoing and an incoming array
+    LIKE_CACHE_TTL = 300  # seconds
+    LIKE_GRAPH_CHANGES = os.path.join(basedir, 'instance', 'like_graph.changes')
+    LIKE_GRAPH_CHANGES_MAX_BYTES = 1024 * 1024
+    LIKE_CACHE_CHECK_INTERVAL = 5  # seconds between reads of the other workers' changes
+    LIKE_SUGGESTION_FANOUT = 200  # mutual matches whose own matches are considered for suggestions
+    LIKE_SUGGESTIONS = 20
+
+    # 'database' queues jobs in the job table for `flask jobs work`; 'memory' runs them as soon as they are
+    # enqueued, in the calling process, for tests and single-process development
+    JOBS_BACKEND = os.environ.get('JOBS_BACKEND') or 'database'
+    JOBS_WORKERS = 4
+    JOBS_POLL_INTERVAL = 1  # seconds between checks for due jobs when the queue is idle
+    JOBS_MAX_ATTEMPTS = 5
+    JOBS_BACKOFF = 5  # seconds before the first retry, doubled for each later one
+    JOBS_BACKOFF_MAX = 60 * 60
+    JOBS_LOCK_TIMEOUT = 10 * 60  # seconds before a running job whose worker died is queued again
+
+    # Responses of read-mostly pages carry ETags and are compressed when the browser accepts it; brotli is used
+    # when the optional brotli package is installed, gzip otherwise
+    COMPRESS_MIN_SIZE = 500  # bytes, smaller bodies are sent as they are
+    COMPRESS_LEVEL = 6  # gzip, 1 (fastest) to 9 (smallest)
+    COMPRESS_BROTLI_QUALITY = 5  # brotli, 0 (fastest) to 11 (smallest)
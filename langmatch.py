@@ -1,7 +1,21 @@
-from app import app, db
-from app.models import User, Question, Answer
+from flask_migrate import Migrate
+
+from app import create_app as create_web_app, db
+from app.models import User, Question, Answer, Language, Conversation, Message, Job
+
+# Only the flask command needs Flask-Migrate, which imports alembic. Web servers that build the app with
+# create_app() directly, e.g. gunicorn 'app:create_app()', skip it
+migrate = Migrate(db=db)
+
+
+def create_app():
+    # The flask command finds this factory and builds the app when a command runs, not when this module is imported
+    app = create_web_app()
+    migrate.init_app(app)
+    app.shell_context_processor(make_shell_context)
+    return app
 
 
-@app.shell_context_processor
 def make_shell_context():
-    return {'db': db, 'User': User, 'Question': Question, 'Answer': Answer}
+    return {'db': db, 'User': User, 'Question': Question, 'Answer': Answer, 'Language': Language,
+            'Conversation': Conversation, 'Message': Message, 'Job': Job}
@@ -0,0 +1,43 @@
+"""answer_fts search table
+
+Revision ID: 4c8e1f7a2d93
+Revises: 9a4e7d2c6b51
+Create Date: 2026-10-18 21:14:52.908417
+
+"""
+import sqlite3
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8e1f7a2d93'
+down_revision = '9a4e7d2c6b51'
+branch_labels = None
+depends_on = None
+
+
+def _fts5_available():
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE probe USING fts5(body)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def upgrade():
+    # Answer search uses FTS5 on SQLite builds that have it and an in-memory index everywhere else.
+    # Databases that already created the table on first search keep it
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite' or not _fts5_available() or \
+            bind.execute(sa.text("SELECT 1 FROM sqlite_master WHERE name = 'answer_fts'")).first():
+        return
+    op.execute("CREATE VIRTUAL TABLE answer_fts USING fts5(body, type UNINDEXED, tokenize = 'porter unicode61')")
+    op.execute('INSERT INTO answer_fts (rowid, body, type) '
+               'SELECT answer.id, answer.body, question.type FROM answer JOIN question ON question.id = answer.question_id')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS answer_fts')
@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app, db
+from app.models import User
+from config import Config
+
+PASSWORD = 'test-password'
+
+
+def build_app(directory, **settings):
+    # Every file the app writes, stamps included, goes under directory; settings override the rest
+    directory.mkdir(parents=True, exist_ok=True)
+
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(directory / 'test.db')
+        WTF_CSRF_ENABLED = False
+        PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+        AVATAR_SOURCE_DIR = str(directory / 'avatars')
+        AVATAR_CACHE_DIR = str(directory / 'avatars' / 'cache')
+        JOBS_BACKEND = 'memory'
+        USER_INDEX_CHECK_INTERVAL = 0
+        CATALOG_CHECK_INTERVAL = 0
+        LIKE_CACHE_CHECK_INTERVAL = 0
+
+    for name in dir(Config):
+        if name.endswith(('_STAMP', '_CHANGES')):
+            setattr(TestConfig, name, str(directory / name.lower()))
+    for name, value in settings.items():
+        setattr(TestConfig, name, value)
+    return create_app(TestConfig)
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = build_app(tmp_path)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    # Further apps in the same process, each with its own database and stamps
+    def make_app(name, **settings):
+        app = build_app(tmp_path / name, **settings)
+        with app.app_context():
+            db.create_all()
+        return app
+    return make_app
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(username, **columns):
+        user = User(username=username, email=username + '@example.com', **columns)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+
+@pytest.fixture
+def login(app):
+    def login(username):
+        client = app.test_client()
+        response = client.post('/login/', data={'username': username, 'password': PASSWORD})
+        assert response.status_code == 302
+        return client
+    return login
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+
+from app import answer_search, db
+from app.models import Question, Answer
+
+
+@pytest.fixture
+def question(app, make_user):
+    make_user('alice')
+    question = Question(body='About me', type='summary')
+    db.session.add(question)
+    db.session.commit()
+    return question
+
+
+def found(query):
+    return [answer.body for answer, _ in answer_search.search(query, 'summary', True)[0]]
+
+
+@pytest.mark.skipif(not answer_search.fts5_available(), reason='SQLite without FTS5')
+def test_index_shares_the_answer_transaction(question):
+    assert isinstance(answer_search.backend(), answer_search.Fts5Backend)
+    answer = Answer(body='I collect trains', user_id=1, question_id=question.id)
+    db.session.add(answer)
+    db.session.flush()
+    answer_search.index(answer, 'summary')
+    db.session.rollback()
+    assert found('trains') == []
+
+    answer = Answer(body='I collect trains', user_id=1, question_id=question.id)
+    db.session.add(answer)
+    db.session.flush()
+    answer_search.index(answer, 'summary')
+    db.session.commit()
+    assert found('trains') == ['I collect trains']
+
+
+def test_inverted_index_sees_answers_from_other_workers(app, question):
+    app.extensions['answer_search'] = answer_search.InvertedIndexBackend(0, 60)
+    db.session.add(Answer(body='I collect trains', user_id=1, question_id=question.id))
+    db.session.commit()
+    assert found('trains') == ['I collect trains']
+
+    # Written and edited by other processes, so this worker's index() never saw them
+    db.session.execute(Answer.__table__.insert().values(body='I restore old trains', user_id=1,
+                                                        question_id=question.id, timestamp=datetime.utcnow()))
+    db.session.execute(Answer.__table__.update().where(Answer.body == 'I collect trains').
+                       values(body='I collect stamps', timestamp=datetime.utcnow()))
+    db.session.commit()
+    assert found('trains') == ['I restore old trains']
+    assert found('stamps') == ['I collect stamps']
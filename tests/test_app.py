@@ -0,0 +1,18 @@
+from app import db
+from app.catalog import questions as catalog
+from app.models import Question
+
+
+def test_apps_keep_their_own_state(app, make_app):
+    other = make_app('other')
+    with other.app_context():
+        db.session.add(Question(body='Only in the other app', type='summary'))
+        db.session.commit()
+        assert [q.body for q in catalog.by_type('summary')] == ['Only in the other app']
+        db.session.remove()
+
+    # Building the second app left this one's catalog, indexes and hashing pool alone
+    assert catalog.by_type('summary') == ()
+    for name in ('question_catalog', 'match_index', 'presence', 'passwords', 'user_snapshots'):
+        assert app.extensions[name] is not other.extensions[name]
+    assert app.extensions['match_index'].changes.path != other.extensions['match_index'].changes.path
@@ -0,0 +1,35 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from app import avatars
+from app.models import User
+
+
+def png(width, height):
+    buf = BytesIO()
+    Image.new('RGB', (width, height)).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def upload(client, data):
+    return client.post('/settings/avatar/', data={'image': (BytesIO(data), 'avatar.png')},
+                       content_type='multipart/form-data')
+
+
+def test_image_over_pixel_limit_is_refused(app):
+    app.config['AVATAR_MAX_PIXELS'] = 100 * 100
+    assert avatars.save_source(png(100, 100))
+    with pytest.raises(ValueError):
+        avatars.save_source(png(101, 100))
+
+
+def test_oversized_upload_is_refused(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    app.config['MAX_CONTENT_LENGTH'] = 1024
+    response = upload(client, b'\0' * 4096)
+    assert response.status_code == 302
+    assert response.location.endswith('/settings/avatar/')
+    assert User.query.filter_by(username='alice').one().avatar_hash is None
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+from itsdangerous import URLSafeSerializer
+
+from app import cursors
+from app.matching import encode_roles
+
+# Everyone else speaks French and studies English, so all of them match alice
+ALICE = encode_roles({0: 0b0001, 1: 0b0010})
+OTHERS = encode_roles({0: 0b0010, 1: 0b0001})
+
+
+def feed(client, cursor=None):
+    response = client.get('/api/browse', query_string={'cursor': cursor} if cursor else {})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def walk(client):
+    usernames = []
+    cursor = None
+    while True:
+        page = feed(client, cursor)
+        usernames += [match['username'] for match in page['matches']]
+        cursor = page['next']
+        if cursor is None:
+            return usernames
+
+
+@pytest.mark.parametrize('language_roles', [ALICE, 0])
+def test_pages_cover_every_user_once(app, make_user, login, language_roles):
+    app.config['BROWSE_PER_PAGE'] = 3
+    make_user('alice', language_roles=language_roles)
+    now = datetime.utcnow()
+    # Pairs share a last_seen, so the recent feed pages through ties on the id
+    names = ['user{}'.format(i) for i in range(10)]
+    for i, name in enumerate(names):
+        make_user(name, language_roles=OTHERS, last_seen=now - timedelta(minutes=i // 2))
+    client = login('alice')
+    seen = walk(client)
+    assert sorted(seen) == sorted(names)
+    if not language_roles:
+        assert seen == sorted(names, key=lambda name: (names.index(name) // 2, -names.index(name)))
+
+
+def test_rejected_cursors_restart_the_feed(app, make_user, login):
+    app.config['BROWSE_PER_PAGE'] = 3
+    make_user('alice', language_roles=ALICE)
+    for i in range(5):
+        make_user('user{}'.format(i), language_roles=OTHERS)
+    client = login('alice')
+    first = feed(client)
+    second = feed(client, first['next'])
+    assert second['matches'] != first['matches']
+
+    values = cursors.decode(first['next'], 'browse')
+    # Signed before the key was rotated, for another purpose, or edited by the client
+    stale = URLSafeSerializer('old ' + app.config['SECRET_KEY'], salt='browse').dumps(values)
+    other_purpose = cursors.encode(values, 'answer-search')
+    edited = first['next'][:-2] + ('AA' if not first['next'].endswith('AA') else 'BB')
+    for cursor in (stale, other_purpose, edited, 'not-a-cursor'):
+        assert feed(client, cursor) == first
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from app import bulk, db
+from app.matching import encode_roles
+from app.models import Answer, Language, Question, User, UserLanguage
+from app.search import search_index
+
+
+@pytest.fixture
+def run(app):
+    def run(*args):
+        return app.test_cli_runner(mix_stderr=False).invoke(args=['users'] + list(args))
+    return run
+
+
+def seed(app):
+    db.session.add_all([Language(code='en', name='English', position=0), Language(code='fr', name='French', position=1),
+                        Question(body='Why are you learning?', type='summary')])
+    db.session.commit()
+
+
+def write_rows(path, rows):
+    path.write_text(''.join((row if isinstance(row, str) else json.dumps(row)) + '\n' for row in rows))
+    return str(path)
+
+
+def row(username, **fields):
+    return dict({'username': username, 'email': username + '@example.com', 'password': 'secret-password',
+                 'zip_code': '10001', 'languages': {'en': ['sp'], 'fr': {'roles': ['st'], 'body': 'Un peu'}},
+                 'answers': [{'question': 'Why are you learning?', 'body': 'Travel'}]}, **fields)
+
+
+@pytest.mark.parametrize('filename', ['users.jsonl', 'users.csv'])
+def test_export_import_round_trip(app, make_app, tmp_path, run, filename):
+    seed(app)
+    assert run('import', write_rows(tmp_path / 'in.jsonl', [row('alice'), row('bob', privacy='3')]),
+               '--workers', '1').exit_code == 0
+    path = str(tmp_path / filename)
+    result = run('export', path)
+    assert result.exit_code == 0
+    assert 'Exported 2 users' in result.stdout
+
+    other = make_app('other')
+    with other.app_context():
+        seed(other)
+        result = other.test_cli_runner(mix_stderr=False).invoke(args=['users', 'import', path, '--workers', '1'])
+        assert result.exit_code == 0
+        assert 'Imported 2 users with 2 answers' in result.stdout
+        bob = User.query.filter_by(username='bob').one()
+        assert bob.privacy == '3'
+        assert bob.check_password('secret-password')
+        assert bob.language_roles == encode_roles({0: 0b0001, 1: 0b0010})
+        assert UserLanguage.query.filter_by(user_id=bob.id, body='Un peu').count() == 1
+        assert [answer.body for answer in Answer.query.filter_by(user_id=bob.id)] == ['Travel']
+        db.session.remove()
+
+
+def test_skipped_rows_are_reported_by_line(app, tmp_path, run, make_user):
+    seed(app)
+    make_user('carol')
+    path = write_rows(tmp_path / 'users.jsonl', [
+        row('alice'),
+        '{not json',
+        row('bob', languages=['en']),
+        row('dave', answers=[{'question': 'Why are you learning?', 'body': 7}]),
+        row('erin', languages={'de': ['sp']}),
+        row('carol'),
+        row('alice', email='other@example.com'),
+    ])
+    result = run('import', path, '--workers', '1')
+    assert result.exit_code == 0
+    assert 'Imported 1 users with 1 answers; skipped 2 existing and 4 invalid rows' in result.stdout
+    assert result.stderr.splitlines() == [
+        'Skipped line 2: not a valid row',
+        'Skipped line 3: languages must map language codes to roles',
+        'Skipped line 4: answers must be text of up to 500 characters',
+        'Skipped line 5: unknown language de',
+        'Skipped line 6: username or email already exists',
+        'Skipped line 7: username or email already exists',
+    ]
+
+
+def test_rows_taken_after_the_check_are_reported(app, tmp_path, run, make_user, monkeypatch):
+    seed(app)
+    make_user('bob')
+    # As if another process registered bob between the duplicate check and the insert
+    monkeypatch.setattr(bulk, '_taken', lambda records: (set(), set()))
+    result = run('import', write_rows(tmp_path / 'users.jsonl', [row('alice'), row('bob'), row('carol')]),
+                 '--workers', '1')
+    assert result.exit_code == 0
+    assert result.stderr.splitlines() == ['Skipped line 2: username or email already exists']
+    assert 'Imported 2 users with 2 answers; skipped 1 existing' in result.stdout
+    assert sorted(username for username, in db.session.query(User.username)) == ['alice', 'bob', 'carol']
+    assert Answer.query.count() == 2
+
+
+def test_imported_users_reach_the_indexes(app, tmp_path, run):
+    seed(app)
+    assert search_index.prefix('al', authenticated=True) == []
+    assert run('import', write_rows(tmp_path / 'users.jsonl', [row('alice')]), '--workers', '1').exit_code == 0
+    alice = User.query.filter_by(username='alice').one()
+    assert search_index.prefix('al', authenticated=True) == [alice.id]
@@ -0,0 +1,36 @@
+from sqlalchemy.pool import QueuePool
+
+from app import database, db
+from config import Config
+
+
+def test_production_sqlite_pools_connections_with_pragmas(make_app, monkeypatch):
+    applied = []
+    apply = database.apply_sqlite_pragmas
+    monkeypatch.setattr(database, 'apply_sqlite_pragmas',
+                        lambda connection, pragmas: applied.extend(pragmas) or apply(connection, pragmas))
+    app = make_app('production', DATABASE_PROFILE='production', SQLALCHEMY_ENGINE_OPTIONS=Config.SQLITE_ENGINE_OPTIONS)
+    engine = db.get_engine(app)
+    assert isinstance(engine.pool, QueuePool)
+    engine.dispose()
+    applied.clear()
+
+    def pragma(connection, name):
+        return connection.execute('PRAGMA {}'.format(name)).scalar()
+
+    first, second = engine.connect(), engine.connect()
+    for connection in (first, second):
+        assert pragma(connection, 'journal_mode') == 'wal'
+        assert pragma(connection, 'synchronous') == 1
+        assert pragma(connection, 'busy_timeout') == 5000
+        assert pragma(connection, 'cache_size') == -16000
+    first.close()
+    second.close()
+    assert applied.count('journal_mode') == 1
+    assert applied.count('busy_timeout') == 2
+
+    # A returned connection is reused, pragmas and all, instead of reopened
+    with engine.connect() as connection:
+        assert pragma(connection, 'busy_timeout') == 5000
+    assert applied.count('busy_timeout') == 2
+    engine.dispose()
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app import cache, db
+from app.forum import create_thread, hot_threads, reply
+from app.models import Language, Post, Thread
+
+
+@pytest.fixture
+def languages(app):
+    english, french = Language(code='en', name='English', position=0), Language(code='fr', name='French', position=1)
+    db.session.add_all([english, french])
+    db.session.commit()
+    return english, french
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(cache, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_replies_keep_the_thread_counters(app, languages, make_user, login):
+    alice = make_user('alice')
+    make_user('bob')
+    thread = create_thread(languages[0].id, alice.id, 'Hello', 'First post')
+    db.session.commit()
+    assert (thread.reply_count, thread.last_activity) == (0, thread.created)
+
+    for username in ('bob', 'alice', 'bob'):
+        assert login(username).post('/forum/thread/{}/'.format(thread.id), data={'body': 'Reply'}).status_code == 302
+    db.session.expire_all()
+    last = Post.query.order_by(Post.id.desc()).first()
+    assert thread.reply_count == Post.query.filter_by(thread_id=thread.id).count() - 1 == 3
+    assert thread.last_activity == last.timestamp
+    assert '3 replies' in app.test_client().get('/forum/en/').get_data(as_text=True)
+
+
+def test_hot_threads_are_ranked_per_language(app, languages, make_user):
+    english, french = languages
+    alice = make_user('alice')
+    quiet = create_thread(english.id, alice.id, 'Quiet', 'Body')
+    busy = create_thread(english.id, alice.id, 'Busy', 'Body')
+    other = create_thread(french.id, alice.id, 'Bonjour', 'Body')
+    stale = create_thread(english.id, alice.id, 'Stale', 'Body')
+    db.session.flush()
+    for _ in range(3):
+        reply(busy.id, alice.id, 'Reply')
+    stale.last_activity = stale.created = datetime.utcnow() - timedelta(days=30)
+    db.session.commit()
+
+    assert [thread.id for thread in hot_threads.get(english.id)] == [busy.id, quiet.id]
+    assert [thread.id for thread in hot_threads.get(french.id)] == [other.id]
+    everywhere = hot_threads.get()
+    assert everywhere[0].id == busy.id and everywhere[0].reply_count == 3
+    assert {thread.id for thread in everywhere} == {busy.id, quiet.id, other.id}
+
+
+def test_hot_threads_are_recomputed_once_the_ttl_passes(app, languages, make_user, clock):
+    alice = make_user('alice')
+    first = create_thread(languages[0].id, alice.id, 'First', 'Body')
+    second = create_thread(languages[0].id, alice.id, 'Second', 'Body')
+    db.session.commit()
+    ranked = hot_threads.get()
+    assert {thread.id for thread in ranked} == {first.id, second.id}
+
+    for _ in range(5):
+        reply(second.id, alice.id, 'Reply')
+    db.session.commit()
+    clock.now += app.config['FORUM_HOT_INTERVAL'] - 1
+    assert hot_threads.get() is ranked
+    clock.now += 2
+    ranked = hot_threads.get()
+    assert (ranked[0].id, ranked[0].reply_count) == (second.id, 5)
@@ -0,0 +1,44 @@
+from flask import template_rendered
+
+from app import db
+from app.models import Answer, Question, User
+
+
+def fragment_renders(app):
+    rendered = []
+
+    def record(sender, template, context, **extra):
+        if template.name == '_profile.html':
+            rendered.append(template.name)
+    template_rendered.connect(record, app, weak=False)
+    return rendered
+
+
+def test_cached_profile_follows_answer_and_privacy_edits(app, make_user, login):
+    question = Question(body='Why are you learning?', type='summary')
+    db.session.add(question)
+    db.session.commit()
+    alice = make_user('alice')
+    make_user('bob')
+    owner, viewer = login('alice'), login('bob')
+    assert owner.post('/answer/{}/'.format(question.id), data={'body': 'Travel'}).status_code == 302
+    rendered = fragment_renders(app)
+
+    def page():
+        return viewer.get('/profile/alice/').get_data(as_text=True)
+
+    assert 'Travel' in page()
+    assert 'Travel' in page()
+    assert len(rendered) == 1
+
+    assert owner.post('/answer/{}/'.format(question.id), data={'body': 'Work'}).status_code == 302
+    assert 'Work' in page() and 'Travel' not in page()
+    assert len(rendered) == 2
+
+    # Committed by another worker: no hook runs here, yet the cached fragment is never served again
+    db.session.execute(Answer.__table__.update().values(body='Study'))
+    db.session.execute(User.__table__.update().where(User.id == alice.id).values(privacy='3'))
+    db.session.commit()
+    html = page()
+    assert 'keeps their profile private' in html and 'Work' not in html
+    assert len(rendered) == 3
@@ -0,0 +1,37 @@
+import pytest
+
+from app import db
+from app.geo import geo_index
+from app.models import User
+
+PHILADELPHIA = {'latitude': 39.95, 'longitude': -75.16}
+
+
+def nearby(client):
+    response = client.get('/browse/nearby/')
+    assert response.status_code == 200
+    return '/profile/bob' in response.get_data(as_text=True)
+
+
+def test_stale_geo_index_never_leaks(app, make_user, login):
+    make_user('alice', **PHILADELPHIA)
+    bob = make_user('bob', privacy='1', **PHILADELPHIA)
+    alice = login('alice')
+    assert nearby(alice)
+
+    # Hidden by another worker, whose commit hooks never run here
+    db.session.execute(User.__table__.update().where(User.id == bob.id).values(privacy='4'))
+    db.session.commit()
+    assert not nearby(alice)
+
+    geo_index.stamp.bump()
+    assert bob.id not in [uid for uid, _ in geo_index.within(39.95, -75.16, 25)]
+
+
+@pytest.mark.parametrize('radius', ['nan', '-inf', 'inf', '-5', '0', 'far', '1e9'])
+def test_nearby_accepts_any_radius(app, make_user, login, radius):
+    make_user('alice', **PHILADELPHIA)
+    make_user('bob', **PHILADELPHIA)
+    response = login('alice').get('/browse/nearby/', query_string={'radius': radius})
+    assert response.status_code == 200
+    assert '/profile/bob' in response.get_data(as_text=True)
@@ -0,0 +1,88 @@
+import gzip
+from types import SimpleNamespace
+
+import pytest
+
+from app import db, http_cache
+from app.models import Question
+
+
+@pytest.fixture
+def question(app):
+    question = Question(body='Why are you learning?', type='summary')
+    db.session.add(question)
+    db.session.commit()
+    return question
+
+
+def test_unchanged_profile_is_not_modified(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    response = client.get('/profile/alice/')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    tag, weak = response.get_etag()
+    assert weak
+
+    response = client.get('/profile/alice/', headers={'If-None-Match': 'W/"{}"'.format(tag)})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.get_etag() == (tag, True)
+
+
+def test_answer_edit_changes_the_etag(app, make_user, login, question):
+    make_user('alice')
+    client = login('alice')
+    assert client.post('/answer/{}/'.format(question.id), data={'body': 'Travel'}).status_code == 302
+    client.get('/profile/alice/')  # shows the flashed message, without a validator
+    tag, _ = client.get('/profile/alice/').get_etag()
+
+    assert client.post('/answer/{}/'.format(question.id), data={'body': 'Work'}).status_code == 302
+    client.get('/profile/alice/')
+    response = client.get('/profile/alice/', headers={'If-None-Match': 'W/"{}"'.format(tag)})
+    assert response.status_code == 200
+    assert 'Work' in response.get_data(as_text=True)
+    assert response.get_etag()[0] != tag
+
+
+def test_gzip_negotiation(app, make_user, login, monkeypatch):
+    monkeypatch.setattr(http_cache, 'brotli', None)
+    make_user('alice')
+    client = login('alice')
+    plain = client.get('/profile/alice/')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    for accept in ('gzip', 'br, gzip'):
+        response = client.get('/profile/alice/', headers={'Accept-Encoding': accept})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert gzip.decompress(response.data) == plain.data
+        # Compression never changes the validator
+        assert response.get_etag() == plain.get_etag()
+    assert 'Content-Encoding' not in client.get('/profile/alice/', headers={'Accept-Encoding': 'br'}).headers
+
+
+def test_brotli_preferred_when_available(app, make_user, login, monkeypatch):
+    monkeypatch.setattr(http_cache, 'brotli', SimpleNamespace(compress=lambda data, quality: b'br:' + data))
+    make_user('alice')
+    client = login('alice')
+    plain = client.get('/profile/alice/')
+    response = client.get('/profile/alice/', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.data == b'br:' + plain.data
+    assert client.get('/profile/alice/', headers={'Accept-Encoding': 'gzip'}).headers['Content-Encoding'] == 'gzip'
+
+
+def test_small_and_not_modified_responses_stay_uncompressed(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    app.config['COMPRESS_MIN_SIZE'] = 10 ** 9
+    response = client.get('/profile/alice/', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' not in response.headers['Vary']
+    app.config['COMPRESS_MIN_SIZE'] = 0
+    tag, _ = response.get_etag()
+    response = client.get('/profile/alice/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': 'W/"{}"'.format(tag)})
+    assert response.status_code == 304
+    assert 'Content-Encoding' not in response.headers
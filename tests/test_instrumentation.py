@@ -0,0 +1,48 @@
+import re
+
+import pytest
+
+
+@pytest.fixture
+def scrape(app):
+    app.config['METRICS_TOKEN'] = 'scrape-token'
+
+    def scrape(**kwargs):
+        return app.test_client().get('/metrics', **kwargs)
+    return scrape
+
+
+def test_metrics_need_the_token_or_an_allowed_address(app, scrape):
+    assert scrape().status_code == 404
+    assert scrape(headers={'Authorization': 'Bearer wrong-token'}).status_code == 404
+    assert scrape(headers={'Authorization': 'Bearer scrape-token'}).status_code == 200
+
+    app.config['METRICS_ALLOWED_IPS'] = ('10.0.0.5',)
+    assert scrape(environ_base={'REMOTE_ADDR': '10.0.0.5'}).status_code == 200
+    assert scrape(environ_base={'REMOTE_ADDR': '10.0.0.6'}).status_code == 404
+
+    app.config['METRICS_TOKEN'] = None
+    assert scrape(headers={'Authorization': 'Bearer None'}).status_code == 404
+
+
+def test_metrics_report_requests_and_statements(app, make_user, login, scrape):
+    make_user('alice')
+    assert login('alice').get('/profile/alice/').status_code == 200
+    response = scrape(headers={'Authorization': 'Bearer scrape-token'})
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    count = re.search(r'^langmatch_request_queries_count\{endpoint="profile.profile"\} (\d+)', text, re.M)
+    assert count and int(count.group(1)) >= 1
+    assert re.search(r'^langmatch_request_seconds_bucket\{endpoint="profile.profile",le="\+Inf"\}', text, re.M)
+    assert 'langmatch_sql_slowest_statement_seconds{statement="SELECT' in text
+
+
+def test_server_timing_header(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    assert 'Server-Timing' not in client.get('/profile/alice/').headers
+
+    app.config['SERVER_TIMING'] = True
+    timing = client.get('/profile/alice/').headers['Server-Timing']
+    match = re.fullmatch(r'sql;dur=[\d.]+;desc="(\d+) queries", tpl;dur=[\d.]+, app;dur=[\d.]+', timing)
+    assert match and int(match.group(1)) >= 1
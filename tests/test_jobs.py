@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+
+from app import db, jobs
+from app.models import Job
+
+
+def add_running(app, attempts, max_attempts):
+    entry = Job(name='avatars.warm', payload='{}', state='running', attempts=attempts, max_attempts=max_attempts,
+                locked_at=datetime.utcnow() - timedelta(seconds=app.config['JOBS_LOCK_TIMEOUT'] + 1))
+    db.session.add(entry)
+    db.session.commit()
+    return entry.id
+
+
+def test_stale_job_out_of_attempts_fails(app):
+    retry = add_running(app, 1, 3)
+    last = add_running(app, 3, 3)
+    assert jobs.requeue_stale() == 1
+    assert Job.query.get(retry).state == 'queued'
+    assert Job.query.get(last).state == 'failed'
+    assert Job.query.get(last).locked_at is None
@@ -0,0 +1,29 @@
+import pytest
+
+from app.models import Language
+
+
+@pytest.fixture
+def run(app):
+    def run(*args):
+        return app.test_cli_runner().invoke(args=['languages'] + list(args))
+    return run
+
+
+def test_add_language(run):
+    result = run('add', 'spanish', 'Spanish')
+    assert result.exit_code == 0
+    assert Language.query.filter_by(code='spanish').one().name == 'Spanish'
+
+
+@pytest.mark.parametrize('code', ['Spanish', 'es-MX', '_es', 'submit', 'meta', 'data', 'validate', 'csrf_token'])
+def test_add_rejects_codes_that_are_not_form_field_names(run, code):
+    result = run('add', code, 'Name')
+    assert result.exit_code != 0
+    assert Language.query.filter_by(code=code).first() is None
+
+
+def test_add_rejects_codes_clashing_with_another_language(run):
+    assert run('add', 'es', 'Spanish').exit_code == 0
+    assert run('add', 'es_body', 'Body').exit_code != 0
+    assert run('add', 'es', 'Spanish again').exit_code != 0
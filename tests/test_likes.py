@@ -0,0 +1,70 @@
+import os
+
+from sqlalchemy import event
+
+from app import db
+from app.likes import like_graph
+from app.models import Like
+
+
+def test_suggestions_load_friends_in_bulk(app, make_user):
+    for i in range(1, 41):
+        make_user('user{}'.format(i))
+    # user1 matches users 2-21, and each of them matches two of users 22-40
+    pairs = [(1, friend) for friend in range(2, 22)]
+    pairs += [(friend, 22 + (friend + k) % 19) for friend in range(2, 22) for k in (0, 1)]
+    db.session.add_all(Like(user_id=a, liked_id=b) for a, b in pairs)
+    db.session.add_all(Like(user_id=b, liked_id=a) for a, b in pairs)
+    db.session.commit()
+    expected = {}
+    for friend in range(2, 22):
+        for other in like_graph.mutual(friend).tolist():
+            if other != 1:
+                expected[other] = expected.get(other, 0) + 1
+    like_graph.cache.clear()
+
+    statements = []
+
+    def count(conn, cursor, statement, *_):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        suggested = like_graph.suggestions(1, 50, 200)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert dict(suggested) == expected
+    # user1's own two arrays plus one query per direction for all twenty friends
+    assert len(statements) == 4
+
+
+def insert_elsewhere(user_id, liked_id):
+    # As another worker would: the row is committed but this worker's hooks never run
+    db.session.execute(Like.__table__.insert().values(user_id=user_id, liked_id=liked_id))
+    db.session.commit()
+
+
+def test_like_buttons_follow_the_row(app, make_user, login):
+    alice = make_user('alice')
+    bob = make_user('bob')
+    client = login('alice')
+    assert like_graph.liked(alice.id).tolist() == []
+    insert_elsewhere(alice.id, bob.id)
+    assert 'value="Unlike"' in client.get('/profile/bob/').get_data(as_text=True)
+
+    for _ in range(2):
+        assert client.post('/unlike/bob/').status_code == 302
+        assert Like.query.get((alice.id, bob.id)) is None
+    for _ in range(2):
+        assert client.post('/like/bob/').status_code == 302
+        assert Like.query.filter_by(user_id=alice.id).count() == 1
+
+
+def test_cache_follows_likes_from_other_workers(app, make_user):
+    alice = make_user('alice')
+    bob = make_user('bob')
+    assert like_graph.liked(alice.id).tolist() == []
+    insert_elsewhere(alice.id, bob.id)
+    with open(app.config['LIKE_GRAPH_CHANGES'], 'a') as f:
+        f.write('{} {}\n{} {}\n'.format(os.getpid() + 1, alice.id, os.getpid() + 1, bob.id))
+    assert like_graph.liked(alice.id).tolist() == [bob.id]
+    assert like_graph.liked_by(bob.id).tolist() == [alice.id]
@@ -0,0 +1,109 @@
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import db
+from app.matching import encode_roles, match_index, role_bits
+from app.models import User, Question, Answer
+
+USERS = 2000
+VIEWERS = 300
+
+
+def seed(rng):
+    # Few languages, so most candidates tie on score and are ordered by last_seen and id
+    now = datetime(2024, 1, 1)
+    db.session.bulk_insert_mappings(User, [
+        {'id': uid, 'username': 'user{}'.format(uid), 'email': 'user{}@example.com'.format(uid),
+         'language_roles': rng.getrandbits(3) | rng.getrandbits(3) << 16 | rng.getrandbits(3) << 32,
+         'last_seen': now - timedelta(minutes=rng.randrange(600))}
+        for uid in range(1, USERS + 1)])
+    db.session.commit()
+
+
+def set_roles(uid, roles):
+    db.session.execute(User.__table__.update().where(User.id == uid).values(language_roles=roles))
+    db.session.commit()
+
+
+def test_refresh_matches_full_rebuild(app):
+    rng = random.Random(7)
+    seed(rng)
+    viewers = rng.sample(range(1, USERS + 1), VIEWERS)
+    for viewer in viewers:
+        match_index.top_matches(viewer)
+
+    changed = rng.sample(range(1, USERS + 1), 5)
+    for uid in changed:
+        set_roles(uid, rng.getrandbits(3) | rng.getrandbits(3) << 16 | rng.getrandbits(3) << 32)
+    refreshed = match_index.refresh(set(changed))
+    # A change reaches only the lists it enters or leaves, not every list whose cutoff score it ties
+    assert refreshed < VIEWERS // 4
+
+    cached = {viewer: match_index.top_matches(viewer) for viewer in viewers}
+    match_index.invalidate()
+    for viewer in viewers:
+        assert match_index.top_matches(viewer) == cached[viewer]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_refreshes_rows_another_worker_changed(app):
+    seed(random.Random(7))
+    best = match_index.top_matches(1)[0][0]
+    generation = match_index.generation
+    # Another worker removes every role of user 1's best match and logs it; no hook runs here
+    set_roles(best, 0)
+    with open(app.config['MATCH_INDEX_CHANGES'], 'a') as f:
+        f.write('{} {}\n'.format(os.getpid() + 1, best))
+    wait_for(lambda: best not in [uid for uid, _, _ in match_index.top_matches(1)])
+    assert match_index.generation == generation
+
+    # A log that started over may have lost lines, so the index is rebuilt
+    os.remove(app.config['MATCH_INDEX_CHANGES'])
+    match_index.top_matches(1)
+    assert match_index.generation > generation
+
+
+def test_only_score_changes_are_logged(app, make_user):
+    alice = make_user('alice')
+    question = Question(body='About me', type='summary')
+    db.session.add(question)
+    db.session.commit()
+    with open(app.config['MATCH_INDEX_CHANGES']) as f:
+        logged = f.read()
+    db.session.add(Answer(body='I like trains', user_id=alice.id, question_id=question.id))
+    alice.city = 'Paris'
+    db.session.commit()
+    with open(app.config['MATCH_INDEX_CHANGES']) as f:
+        assert f.read() == logged
+    alice.language_roles = encode_roles({0: role_bits(['sp'])})
+    db.session.commit()
+    with open(app.config['MATCH_INDEX_CHANGES']) as f:
+        assert f.read() == logged + '{} {}\n'.format(os.getpid(), alice.id)
+
+
+def test_each_app_refreshes_its_own_index(app, make_app):
+    learner = encode_roles({0: role_bits(['sp']), 1: role_bits(['st'])})
+    speaker = encode_roles({1: role_bits(['sp'])})
+    # Starts the refresh thread of the first app
+    db.session.add(User(username='first', email='first@example.com', language_roles=speaker))
+    db.session.commit()
+    db.session.remove()
+
+    other = make_app('other')
+    with other.app_context():
+        for name, roles in (('alice', learner), ('bob', speaker), ('carol', speaker)):
+            db.session.add(User(username=name, email=name + '@example.com', language_roles=roles))
+        db.session.commit()
+        assert [uid for uid, _, _ in match_index.top_matches(1)] == [3, 2]
+        User.query.get(3).language_roles = 0
+        db.session.commit()
+        wait_for(lambda: [uid for uid, _, _ in match_index.top_matches(1)] == [2])
+        db.session.remove()
@@ -0,0 +1,43 @@
+import asyncio
+
+from app import db, messaging
+from app.message_stream import MessageStream
+from app.models import Message
+
+
+def test_late_commit_below_delivered_id_is_delivered_once(app, make_user):
+    alice = make_user('alice')
+    bob = make_user('bob')
+    conversation = messaging.start_conversation(alice.id, bob.id)
+    db.session.commit()
+    stream = MessageStream(app, 0, 15, 10)
+    queue = asyncio.Queue(100)
+    queue.overflowed = False
+    stream.clients[bob.id] = {queue}
+
+    def drain():
+        ids = []
+        while not queue.empty():
+            ids.append(queue.get_nowait()['id'])
+        return ids
+
+    def insert(id):
+        db.session.add(Message(id=id, conversation_id=conversation.id, sender_id=alice.id, body=str(id)))
+        db.session.commit()
+
+    insert(1)
+    insert(3)
+    asyncio.run(stream.poll_once())
+    assert drain() == [1, 3]
+    # Message 2 got its id first but committed after 3 was delivered
+    insert(2)
+    asyncio.run(stream.poll_once())
+    asyncio.run(stream.poll_once())
+    assert drain() == [2]
+
+    # Once the overlap has passed, polls start after everything delivered
+    stream.overlap = 0
+    asyncio.run(stream.poll_once())
+    asyncio.run(stream.poll_once())
+    assert stream.after == 3
+    assert drain() == []
@@ -0,0 +1,39 @@
+import pytest
+
+from app import models
+from app.models import User
+from app.passwords import PasswordHasherBusy, hash_password, needs_rehash
+
+
+@pytest.mark.parametrize('method', ['pbkdf2:sha256', 'pbkdf2:sha256:1000', 'pbkdf2:sha512:2000', 'sha256'])
+def test_fresh_hash_is_current(app, method):
+    app.config['PASSWORD_HASH_METHOD'] = method
+    assert not needs_rehash(hash_password('secret'))
+
+
+@pytest.mark.parametrize('method', ['plain', 'scrypt', 'bcrypt', 'pbkdf2', 'pbkdf2:nosuch', 'pbkdf2:sha256:many',
+                                    'pbkdf2:sha256:1000:1', 'sha256:1000'])
+def test_unsupported_method_is_refused_at_startup(make_app, method):
+    with pytest.raises(ValueError, match='PASSWORD_HASH_METHOD'):
+        make_app('app', PASSWORD_HASH_METHOD=method)
+
+
+def test_changed_cost_is_outdated(app):
+    pwhash = hash_password('secret')
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    assert needs_rehash(pwhash)
+    app.config['PASSWORD_SALT_LENGTH'] += 1
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    assert needs_rehash(pwhash)
+
+
+def test_login_survives_busy_rehash(app, make_user, login, monkeypatch):
+    make_user('alice')
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+
+    def busy(password):
+        raise PasswordHasherBusy()
+    monkeypatch.setattr(models, 'hash_password', busy)
+    client = login('alice')
+    assert client.get('/settings/').status_code == 200
+    assert needs_rehash(User.query.filter_by(username='alice').one().password_hash)
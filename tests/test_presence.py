@@ -0,0 +1,37 @@
+import time
+
+from sqlalchemy import text
+
+from app import db, presence as presence_module
+from app.models import User
+from app.presence import presence
+
+
+def test_failed_flush_keeps_the_batch_and_serves_the_page(app, make_user, login, monkeypatch):
+    alice = make_user('alice')
+    monkeypatch.setattr(presence, 'flush_threshold', 1)
+    monkeypatch.setattr(presence_module, '_update_last_seen',
+                        text('UPDATE missing_table SET last_seen = :seen WHERE id = :uid'))
+    client = login('alice')
+    assert client.get('/settings/').status_code == 200
+    assert alice.id in presence.pending
+
+    monkeypatch.undo()
+    assert presence.flush() == 1
+    # The UPDATE ran on its own connection, so the session's copy of alice is stale
+    db.session.expire_all()
+    assert User.query.get(alice.id).last_seen is not None
+
+
+def test_idle_worker_flushes_on_a_timer(app, make_user, login, monkeypatch):
+    alice = make_user('alice')
+    monkeypatch.setattr(presence, 'flush_interval', 0.05)
+    # Requests see a recent flush and leave their values buffered, and no later request comes to flush them
+    monkeypatch.setattr(presence, 'last_flush', time.monotonic() + 3600)
+    login('alice').get('/settings/')
+    deadline = time.monotonic() + 5
+    while presence.pending or presence.flusher is not None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    db.session.expire_all()
+    assert User.query.get(alice.id).last_seen == presence.last_seen(alice.id)
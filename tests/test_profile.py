@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.catalog import questions as catalog
+from app.models import User, Question, Answer
+
+
+def add_answered_questions(count, *users):
+    start = Question.query.count()
+    questions = [Question(body='Question {}'.format(start + i), type='summary') for i in range(count)]
+    db.session.add_all(questions)
+    db.session.flush()
+    db.session.add_all(Answer(body='Answer', user_id=user.id, question_id=question.id)
+                       for question in questions for user in users)
+    db.session.commit()
+    catalog.by_type('summary')
+
+
+def queries_for(client, path):
+    statements = []
+    thread = threading.get_ident()
+
+    # Only the request's own statements; index refresh threads share the engine
+    def count(conn, cursor, statement, *_):
+        if threading.get_ident() == thread:
+            statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        assert client.get(path).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return len(statements)
+
+
+def test_profile_query_count_does_not_grow_with_questions(app, make_user):
+    bob = make_user('bob')
+    carol = make_user('carol')
+    client = app.test_client()
+    add_answered_questions(5, bob, carol)
+    few = queries_for(client, '/profile/bob/')
+    # carol has never been rendered either, so both requests miss the fragment cache
+    add_answered_questions(45, bob, carol)
+    assert queries_for(client, '/profile/carol/') == few
+
+
+def test_fragment_follows_changes_from_other_workers(app, make_user):
+    bob = make_user('bob', privacy='1')
+    question = Question(body='About me', type='summary')
+    db.session.add(question)
+    db.session.flush()
+    db.session.add(Answer(body='I like trains', user_id=bob.id, question_id=question.id))
+    db.session.commit()
+    anonymous = app.test_client()
+    assert 'I like trains' in anonymous.get('/profile/bob/').get_data(as_text=True)
+
+    # Hidden by another worker, whose commit hooks never run here
+    db.session.execute(User.__table__.update().where(User.id == bob.id).values(privacy='4'))
+    db.session.commit()
+    page = anonymous.get('/profile/bob/').get_data(as_text=True)
+    assert 'I like trains' not in page
+    assert 'keeps their profile private' in page
+
+
+@pytest.mark.parametrize('path', ['/answer/abc/', '/answer/-1/', '/answer/999/'])
+def test_unknown_answer_pages_are_not_found(app, make_user, login, path):
+    make_user('alice')
+    assert login('alice').get(path).status_code == 404
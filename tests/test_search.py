@@ -0,0 +1,57 @@
+from app import db
+from app.matching import encode_roles
+from app.models import User
+from app.search import search_index
+
+# alice speaks English and studies French, bob the other way round, so each is the other's best match
+ALICE = encode_roles({0: 0b0001, 1: 0b0010})
+BOB = encode_roles({0: 0b0010, 1: 0b0001})
+
+
+def listed(client, path, username):
+    response = client.get(path)
+    assert response.status_code == 200
+    return '/profile/{}'.format(username) in response.get_data(as_text=True)
+
+
+def test_hidden_user_leaves_search_and_browse(app, make_user, login):
+    make_user('alice', language_roles=ALICE)
+    bob = make_user('bob', language_roles=BOB, privacy='1')
+    alice = login('alice')
+    anonymous = app.test_client()
+    assert listed(anonymous, '/search/?q=b', 'bob')
+    assert listed(alice, '/browse/', 'bob')
+
+    bob.privacy = '4'
+    db.session.commit()
+    assert not listed(anonymous, '/search/?q=b', 'bob')
+    assert not listed(alice, '/search/?q=b', 'bob')
+    assert not listed(alice, '/browse/', 'bob')
+
+
+def test_registered_only_user_hidden_from_anonymous(app, make_user, login):
+    make_user('alice', language_roles=ALICE)
+    make_user('bob', language_roles=BOB, privacy='2')
+    assert not listed(app.test_client(), '/search/?q=b', 'bob')
+    assert listed(login('alice'), '/search/?q=b', 'bob')
+
+
+def test_stale_index_never_leaks(app, make_user, login):
+    make_user('alice', language_roles=ALICE)
+    bob = make_user('bob', language_roles=BOB, privacy='1')
+    alice = login('alice')
+    anonymous = app.test_client()
+    assert listed(anonymous, '/search/?q=b', 'bob')
+    assert listed(alice, '/browse/', 'bob')
+
+    # Another worker hides bob: this process sees the row change but none of the commit hooks
+    db.session.execute(User.__table__.update().where(User.id == bob.id).values(privacy='4'))
+    db.session.commit()
+    assert bob.id in search_index.prefix('b', False)
+    assert not listed(anonymous, '/search/?q=b', 'bob')
+    assert not listed(alice, '/search/?q=b', 'bob')
+    assert not listed(alice, '/browse/', 'bob')
+
+    # Its commit also moved the index stamp, which makes this worker rebuild from the database
+    search_index.stamp.bump()
+    assert bob.id not in search_index.prefix('b', False)